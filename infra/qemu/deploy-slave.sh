@@ -5,7 +5,7 @@ set -euo pipefail
 # Deploy Modbus TCP Slave to QEMU Ubuntu VM
 # ============================================================================
 #
-# Uploads modbus_slave.py, installs pymodbus, starts the slave process.
+# Uploads modbus_slave.py, installs its requirements, starts the slave process.
 # Uses SSH key auth (ed25519 injected via cloud-init).
 #
 # Usage:
@@ -49,10 +49,10 @@ $SCP -r "$SCRIPT_DIR/modbus-slave/" ubuntu@"$VM_IP":/home/ubuntu/
 log "Files uploaded"
 
 # --- Install dependencies ---
-step "Installing pymodbus"
+step "Installing pymodbus + numpy"
 
-$SSH ubuntu@"$VM_IP" "sudo pip3 install --break-system-packages -q pymodbus 2>&1 | tail -3"
-log "pymodbus installed"
+$SSH ubuntu@"$VM_IP" "sudo pip3 install --break-system-packages -q -r /home/ubuntu/modbus-slave/requirements.txt 2>&1 | tail -3"
+log "Requirements installed"
 
 # --- Start slave via systemd ---
 step "Starting Modbus TCP slave"
@@ -0,0 +1,198 @@
+"""Vectorized analog plant models behind holding and input registers.
+
+Each analog channel drives one input register from a target value:
+  - target: a holding register setpoint scaled by gain/offset, or `high`
+    when the channel has no setpoint; a channel with a coil falls back to
+    `low` while its coil is off (e.g. line pressure behind a valve)
+  - ramp:   the reference follows the target at most ramp_per_s units/s
+  - lag:    the value follows the reference as a first-order lag with
+            time constant tau_ms
+  - noise:  Gaussian noise of standard deviation `noise`, drawn from one
+            seeded generator, is added to the published register
+All channels of all units are stepped together as NumPy arrays, so a
+thousand channels cost about what one does.
+
+Channels come from the HAL config, keyed by input register name:
+
+  [simulation.analog.pressure]
+  setpoint = "speed_setpoint"   # holding register name (optional)
+  coil = "valve_extend"         # coil gating the target (optional)
+  gain = 1.0                    # target = setpoint * gain + offset
+  offset = 0.0
+  low = 0.0                     # target while the coil is off
+  high = 1000.0                 # target without a setpoint
+  tau_ms = 200                  # first-order lag, 0 = none
+  ramp_per_s = 500              # setpoint slew limit, 0 = none
+  noise = 2.0                   # noise standard deviation
+  initial = 0.0
+
+The RustPLC runtime ignores [simulation.*]. --analog-channels N instead
+makes input register i track holding register i on every unit, with a
+lag, a ramp and noise, for load tests.
+"""
+
+import numpy as np
+
+REG_MAX = 0xFFFF
+
+DEFAULTS = {
+    "gain": 1.0,
+    "offset": 0.0,
+    "low": 0.0,
+    "high": 0.0,
+    "tau_ms": 0.0,
+    "ramp_per_s": 0.0,
+    "noise": 0.0,
+    "initial": 0.0,
+}
+PARAMETERS = tuple(DEFAULTS)
+
+# --analog-channels models.
+SYNTHETIC = {"tau_ms": 200.0, "ramp_per_s": 1000.0, "noise": 2.0}
+
+
+class AnalogBinding:
+    """Flat per-channel table: register/coil indices and model constants.
+
+    Index -1 means "not mapped" and points at the spare slot of the image.
+    """
+
+    def __init__(self, names, input_reg, setpoint_reg=None, coil=None, **parameters):
+        count = len(names)
+        self.names = list(names)
+        self.count = count
+        self.input_reg = np.array(input_reg, dtype=np.intp)
+        self.setpoint_reg = _index(setpoint_reg, count)
+        self.coil = _index(coil, count)
+        # Which channels have a setpoint / gating coil; kept by concat,
+        # which moves the -1 indices to spare slots.
+        self.has_setpoint = self.setpoint_reg >= 0
+        self.gated = self.coil >= 0
+        for name in PARAMETERS:
+            value = parameters.get(name, DEFAULTS[name])
+            setattr(self, name, np.broadcast_to(np.asarray(value, dtype=np.float64), (count,)).copy())
+
+    @property
+    def input_span(self):
+        return int(self.input_reg.max()) + 1 if self.count else 0
+
+    @property
+    def setpoint_span(self):
+        return int(self.setpoint_reg.max()) + 1 if self.count else 0
+
+    @classmethod
+    def concat(cls, parts):
+        """Join per-unit bindings into one binding over concatenated images.
+
+        :param parts: (binding, name_prefix, coil_offset, coil_span, hr_offset,
+            hr_span, ir_offset) tuples; -1 indices move to each unit's spare slot
+        """
+        names, inputs, setpoints, coils = [], [], [], []
+        for binding, prefix, coil_offset, coil_span, hr_offset, hr_span, ir_offset in parts:
+            names += [prefix + name for name in binding.names]
+            inputs.append(binding.input_reg + ir_offset)
+            setpoints.append(np.where(binding.setpoint_reg >= 0, binding.setpoint_reg + hr_offset,
+                                      hr_offset + hr_span))
+            coils.append(np.where(binding.coil >= 0, binding.coil + coil_offset, coil_offset + coil_span))
+        bindings = [part[0] for part in parts]
+        joint = cls(
+            names,
+            np.concatenate(inputs),
+            np.concatenate(setpoints),
+            np.concatenate(coils),
+            **{name: np.concatenate([getattr(b, name) for b in bindings]) for name in PARAMETERS},
+        )
+        joint.has_setpoint = np.concatenate([b.has_setpoint for b in bindings])
+        joint.gated = np.concatenate([b.gated for b in bindings])
+        return joint
+
+
+def _index(values, count):
+    if values is None:
+        return np.full(count, -1, dtype=np.intp)
+    return np.array(values, dtype=np.intp)
+
+
+def load_analog(hal_map):
+    """Compile the [simulation.analog.*] tables of a HAL config."""
+    names, inputs, setpoints, coils = [], [], [], []
+    parameters = {name: [] for name in PARAMETERS}
+    for name, spec in hal_map.analog.items():
+        if name not in hal_map.input_registers:
+            raise ValueError(f"{hal_map.source}: simulation.analog.{name} is not an input register")
+        unknown = set(spec) - set(PARAMETERS) - {"setpoint", "coil"}
+        if unknown:
+            raise ValueError(f"{hal_map.source}: simulation.analog.{name}: unknown keys {sorted(unknown)}")
+        names.append(name)
+        inputs.append(hal_map.input_registers[name])
+        setpoints.append(_lookup(hal_map, "holding_registers", name, spec.get("setpoint")))
+        coils.append(_lookup(hal_map, "coils", name, spec.get("coil")))
+        for key in PARAMETERS:
+            parameters[key].append(float(spec.get(key, DEFAULTS[key])))
+    return AnalogBinding(names, inputs, setpoints, coils, **parameters)
+
+
+def _lookup(hal_map, table, name, device):
+    if device is None:
+        return -1
+    addresses = getattr(hal_map, table)
+    if device not in addresses:
+        raise ValueError(f"{hal_map.source}: simulation.analog.{name}: {device!r} is not in mapping.{table}")
+    return addresses[device]
+
+
+def synthetic_analog(count):
+    """count channels: input register i tracks holding register i."""
+    return AnalogBinding(
+        [f"ai{i}" for i in range(count)],
+        np.arange(count),
+        np.arange(count),
+        high=REG_MAX,
+        **SYNTHETIC,
+    )
+
+
+class AnalogBank:
+    """All analog channels stepped together as NumPy arrays."""
+
+    # State saved by checkpoint.Checkpoint, besides the noise generator's.
+    STATE_ARRAYS = ("reference", "value")
+
+    def __init__(self, binding, seed=0):
+        self.binding = binding
+        self.count = binding.count
+        self.reference = binding.initial.copy()
+        self.value = binding.initial.copy()
+        self.noisy = bool((binding.noise > 0).any())
+        self.rng = np.random.default_rng(seed)
+        self._lag_dt = None
+        self._lag = None
+
+    def step(self, dt_ms, coils, registers):
+        """Advance every channel by dt_ms.
+
+        :param coils: joint coil image (bool)
+        :param registers: joint holding register image
+        :returns: uint16 input register values, one per channel
+        """
+        b = self.binding
+        target = np.where(b.has_setpoint, registers[b.setpoint_reg] * b.gain + b.offset, b.high)
+        target = np.where(b.gated & ~coils[b.coil], b.low, target)
+
+        slew = np.where(b.ramp_per_s > 0, b.ramp_per_s * (dt_ms / 1000.0), np.inf)
+        self.reference += np.clip(target - self.reference, -slew, slew)
+        self.value += self._lag_factor(dt_ms) * (self.reference - self.value)
+
+        out = self.value
+        if self.noisy:
+            out = out + self.rng.standard_normal(self.count) * b.noise
+        return np.clip(np.rint(out), 0, REG_MAX).astype(np.uint16)
+
+    def _lag_factor(self, dt_ms):
+        """Per-channel lag factor for a step of dt_ms (cached for equal steps)."""
+        if dt_ms != self._lag_dt:
+            tau = self.binding.tau_ms
+            with np.errstate(divide="ignore"):
+                self._lag = np.where(tau > 0, -np.expm1(-dt_ms / tau), 1.0)
+            self._lag_dt = dt_ms
+        return self._lag
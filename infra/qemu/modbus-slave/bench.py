@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Modbus TCP load generator and throughput benchmark for modbus_slave.py.
+
+Opens K concurrent asyncio connections and replays a weighted mix of
+function codes at a target total request rate, then reports throughput,
+per-FC latency percentiles, a latency histogram and the slave's tick
+overruns over the run (read from its control window, see control.py).
+
+Each connection sends one request at a time on its own absolute deadline
+grid (rate/K per connection), so a slow slave shows up as latency and as
+"late" sends instead of silently lowering the offered load. Function
+codes and addresses are drawn from a seeded generator, so two runs with
+the same arguments send the same request sequence.
+
+Mix syntax: comma-separated FC=weight pairs, e.g. "1=4,2=4,5=1,15=1,3=1,4=1"
+  1/2   read coils / discrete inputs (--count bits)
+  5/15  write single / multiple coils (--count bits for 15)
+  3/4   read holding / input registers (--count registers)
+
+Usage:
+  # against a running slave
+  python3 bench.py --port 502 --connections 8 --rate 2000 --duration 10
+  # start a local slave for the run (remaining args go to modbus_slave.py)
+  python3 bench.py --spawn --connections 8 --rate 0 -- --cycle-ms 10 --cylinders 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+from pymodbus.client import AsyncModbusTcpClient
+
+from control import CONTROL_BASE, REG_OVERRUNS_HI, REG_TICKS_HI
+
+DEFAULT_MIX = "1=4,2=4,5=1,15=1,3=1,4=1"
+FUNCTION_CODES = (1, 2, 3, 4, 5, 15)
+
+# Latency histogram buckets: 50 us .. ~1.6 s, four per octave.
+HISTOGRAM_EDGES_US = 50.0 * 2.0 ** (np.arange(61) / 4)
+
+
+def parse_mix(text):
+    """Parse "FC=weight,..." into (codes, probabilities)."""
+    codes, weights = [], []
+    for part in text.split(","):
+        code, _, weight = part.partition("=")
+        code = int(code)
+        if code not in FUNCTION_CODES:
+            raise argparse.ArgumentTypeError(f"unsupported function code {code}")
+        codes.append(code)
+        weights.append(float(weight or 1))
+    weights = np.array(weights)
+    if (weights < 0).any() or weights.sum() <= 0:
+        raise argparse.ArgumentTypeError("weights must be non-negative and not all zero")
+    return np.array(codes), weights / weights.sum()
+
+
+def request(client, code, address, count, device_id):
+    """Return the pymodbus coroutine for one request of function code `code`."""
+    if code == 1:
+        return client.read_coils(address, count=count, device_id=device_id)
+    if code == 2:
+        return client.read_discrete_inputs(address, count=count, device_id=device_id)
+    if code == 3:
+        return client.read_holding_registers(address, count=count, device_id=device_id)
+    if code == 4:
+        return client.read_input_registers(address, count=count, device_id=device_id)
+    if code == 5:
+        return client.write_coil(address, bool(address & 1), device_id=device_id)
+    return client.write_coils(address, [bool(i & 1) for i in range(count)], device_id=device_id)
+
+
+async def read_clock(client, device_id):
+    """Return (ticks, overruns) from the slave's control window, or None."""
+    response = await client.read_holding_registers(CONTROL_BASE, count=5, device_id=device_id)
+    if response.isError():
+        return None
+    regs = response.registers
+    ticks = regs[REG_TICKS_HI] << 16 | regs[REG_TICKS_HI + 1]
+    overruns = regs[REG_OVERRUNS_HI] << 16 | regs[REG_OVERRUNS_HI + 1]
+    return ticks, overruns
+
+
+async def connection(index, args, codes, probabilities, start, results):
+    """Run one connection's share of the load until the deadline."""
+    rng = np.random.default_rng([args.seed, index])
+    client = AsyncModbusTcpClient(args.host, port=args.port, timeout=args.timeout)
+    await client.connect()
+    period = args.connections / args.rate if args.rate > 0 else 0.0
+    end = start + args.duration
+    latencies, fcs, late, errors = results
+    sent = 0
+    try:
+        while True:
+            deadline = start + sent * period
+            now = time.perf_counter()
+            if now >= end:
+                break
+            if deadline > now:
+                await asyncio.sleep(deadline - now)
+            elif period and now - deadline > period:
+                late[index] += 1
+            code = int(rng.choice(codes, p=probabilities))
+            count = 1 if code == 5 else args.count
+            address = int(rng.integers(0, args.span - count + 1))
+            t0 = time.perf_counter()
+            try:
+                response = await request(client, code, address, count, args.unit)
+                failed = response.isError()
+            except Exception:  # timeouts and dropped connections count as errors
+                failed = True
+            latencies.append(time.perf_counter() - t0)
+            fcs.append(code)
+            errors[index] += failed
+            sent += 1
+    finally:
+        client.close()
+
+
+async def run(args):
+    codes, probabilities = args.mix
+    probe = AsyncModbusTcpClient(args.host, port=args.port, timeout=args.timeout)
+    await probe.connect()
+    before = await read_clock(probe, args.unit)
+
+    latencies, fcs = [], []
+    late = [0] * args.connections
+    errors = [0] * args.connections
+    results = (latencies, fcs, late, errors)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        connection(i, args, codes, probabilities, start, results)
+        for i in range(args.connections)
+    ))
+    elapsed = time.perf_counter() - start
+
+    after = await read_clock(probe, args.unit)
+    probe.close()
+    return summarize(args, np.array(latencies), np.array(fcs), sum(late), sum(errors),
+                     elapsed, before, after)
+
+
+def percentiles(latencies):
+    if latencies.size == 0:
+        return {}
+    p50, p90, p99, p999 = np.percentile(latencies, [50, 90, 99, 99.9]) * 1e3
+    return {
+        "p50_ms": p50, "p90_ms": p90, "p99_ms": p99, "p999_ms": p999,
+        "max_ms": latencies.max() * 1e3,
+    }
+
+
+def summarize(args, latencies, fcs, late, errors, elapsed, before, after):
+    summary = {
+        "connections": args.connections,
+        "target_rate": args.rate,
+        "mix": args.mix_text,
+        "duration_s": elapsed,
+        "requests": int(latencies.size),
+        "errors": errors,
+        "late_sends": late,
+        "throughput_rps": latencies.size / elapsed,
+        "latency": percentiles(latencies),
+        "per_fc": {
+            int(code): {"requests": int((fcs == code).sum()), **percentiles(latencies[fcs == code])}
+            for code in np.unique(fcs)
+        },
+        "histogram_us": np.histogram(latencies * 1e6, bins=HISTOGRAM_EDGES_US)[0].tolist(),
+    }
+    if before is not None and after is not None:
+        summary["ticks"] = after[0] - before[0]
+        summary["tick_overruns"] = after[1] - before[1]
+    return summary
+
+
+def report(summary):
+    print(
+        "%d requests in %.2fs over %d connections: %.0f req/s (target %s), %d errors, %d late sends"
+        % (summary["requests"], summary["duration_s"], summary["connections"],
+           summary["throughput_rps"], summary["target_rate"] or "unbounded",
+           summary["errors"], summary["late_sends"])
+    )
+    if "ticks" in summary:
+        print("slave: %d ticks, %d overruns" % (summary["ticks"], summary["tick_overruns"]))
+    print("%-6s %9s %9s %9s %9s %9s %9s" % ("fc", "requests", "p50 ms", "p90 ms", "p99 ms", "p99.9 ms", "max ms"))
+    rows = [("all", summary["requests"], summary["latency"])]
+    rows += [(f"fc{code:02d}", stats["requests"], stats) for code, stats in summary["per_fc"].items()]
+    for name, count, stats in rows:
+        if not stats:
+            continue
+        print("%-6s %9d %9.3f %9.3f %9.3f %9.3f %9.3f" % (
+            name, count, stats["p50_ms"], stats["p90_ms"], stats["p99_ms"],
+            stats["p999_ms"], stats["max_ms"],
+        ))
+
+    histogram = summary["histogram_us"]
+    peak = max(histogram, default=0)
+    nonzero = [i for i, n in enumerate(histogram) if n]
+    if not nonzero:
+        return
+    print("latency histogram:")
+    for i in range(nonzero[0], nonzero[-1] + 1):
+        bar = "#" * round(40 * histogram[i] / peak)
+        print("  %9.0f us  %8d  %s" % (HISTOGRAM_EDGES_US[i], histogram[i], bar))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_slave(port, slave_args):
+    """Start modbus_slave.py on localhost and wait until it accepts connections."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modbus_slave.py")
+    proc = subprocess.Popen(
+        [sys.executable, script, "--host", "127.0.0.1", "--port", str(port), *slave_args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"modbus_slave.py exited with status {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("modbus_slave.py did not start listening within 10s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modbus TCP benchmark for the RustPLC slave")
+    parser.add_argument("--host", default="127.0.0.1", help="Slave address")
+    parser.add_argument("--port", type=int, default=502, help="Slave TCP port")
+    parser.add_argument("--unit", type=int, default=1, help="Unit ID to address")
+    parser.add_argument("--connections", "-k", type=int, default=4, help="Concurrent connections")
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="Target total requests/s (0: as fast as possible)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Run time (s)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"FC=weight list (default {DEFAULT_MIX})")
+    parser.add_argument("--count", type=int, default=16, help="Bits/registers per read and FC15 write")
+    parser.add_argument("--span", type=int, default=64, help="Addresses drawn from 0..span-1")
+    parser.add_argument("--timeout", type=float, default=1.0,
+                        help="Per-request timeout (s); RustPLC uses timeout_ms = 1000")
+    parser.add_argument("--seed", type=int, default=0, help="Request sequence seed")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start modbus_slave.py on a free localhost port for the run")
+    parser.add_argument("slave_args", nargs="*", help="Arguments for modbus_slave.py (with --spawn)")
+    args = parser.parse_args()
+    args.mix_text = args.mix
+    try:
+        args.mix = parse_mix(args.mix)
+    except (ValueError, argparse.ArgumentTypeError) as exc:
+        parser.error(f"--mix: {exc}")
+    if args.count > args.span:
+        parser.error("--count must not exceed --span")
+
+    proc = None
+    if args.spawn:
+        args.host = "127.0.0.1"
+        args.port = free_port()
+        proc = spawn_slave(args.port, args.slave_args)
+    try:
+        summary = asyncio.run(run(args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        report(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""In-process checkpoint and restore of the whole simulated plant.
+
+Getting a clean plant between two Mode B test cases used to mean
+restarting the slave (and the master reconnecting). Instead, every piece
+of plant state is listed once, when the simulation is built, and copied
+into a single preallocated buffer:
+  - arrays: NumPy arrays whose shape and dtype never change (I/O images,
+    cylinder counters and sensors, motor angles and speeds, analog
+    channels, monitor state), optionally a slice of one (the used part of
+    a datablock). Each gets a fixed, 8-byte aligned slot in the buffer, so
+    a save or a restore is one copy per array and no allocation; restore
+    writes back in place, so every reference to the live arrays stays valid.
+  - values: everything else (counters, plant times, the pending edge heap,
+    the analog noise generator's state), saved by shallow copy.
+"""
+
+import copy
+
+import numpy as np
+
+ALIGN = 8
+
+
+class Checkpoint:
+    """One saved copy of a fixed set of plant state."""
+
+    def __init__(self, arrays, values=()):
+        """:param arrays: (owner, attribute) or (owner, attribute, index)
+            tuples naming NumPy arrays, or the part getattr(owner,
+            attribute)[index] of one
+        :param values: (owner, attribute) pairs of any other state
+        """
+        self.arrays = [(owner, name, index[0] if index else slice(None))
+                       for owner, name, *index in arrays]
+        self.values = list(values)
+        live = [getattr(owner, name)[index] for owner, name, index in self.arrays]
+        offsets = []
+        size = 0
+        for array in live:
+            size = -(-size // ALIGN) * ALIGN
+            offsets.append(size)
+            size += array.nbytes
+        self.buffer = np.zeros(size, dtype=np.uint8)
+        self.slots = [
+            np.ndarray(array.shape, dtype=array.dtype, buffer=self.buffer, offset=offset)
+            for array, offset in zip(live, offsets)
+        ]
+        self.saved = [None] * len(self.values)
+
+    @property
+    def nbytes(self):
+        """Size of the array buffer."""
+        return self.buffer.nbytes
+
+    def save(self):
+        """Copy the current state into the checkpoint."""
+        for (owner, name, index), slot in zip(self.arrays, self.slots):
+            np.copyto(slot, getattr(owner, name)[index])
+        self.saved = [copy.copy(getattr(owner, name)) for owner, name in self.values]
+
+    def restore(self):
+        """Put the saved state back; the checkpoint stays for the next restore."""
+        for (owner, name, index), slot in zip(self.arrays, self.slots):
+            getattr(owner, name)[index] = slot
+        for (owner, name), value in zip(self.values, self.saved):
+            setattr(owner, name, copy.copy(value))
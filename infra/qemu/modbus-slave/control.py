@@ -0,0 +1,171 @@
+"""Control registers for driving the simulator from the Modbus master.
+
+A window of reserved holding registers carries commands that act on the
+simulator itself rather than on the plant, so a test harness can use the
+same Modbus connection as the PLC runtime:
+
+  base+0  ADVANCE   write N: run N ticks now (lockstep clock only). The
+                    write response is sent after the ticks have run, so
+                    the next read sees the advanced plant. Reads return
+                    the last N written.
+  base+1  TICKS_HI  read: ticks run so far, high word
+  base+2  TICKS_LO  read: ticks run so far, low word
+  base+3  OVERRUNS_HI  read: late ticks so far (wall clock), high word
+  base+4  OVERRUNS_LO  read: late ticks so far, low word
+  base+5  VIOLATIONS_HI  read: safety rule violations so far, high word
+  base+6  VIOLATIONS_LO  read: safety rule violations so far, low word
+  base+7  LATE_HI  read: strokes over their step timeout so far, high word
+  base+8  LATE_LO  read: strokes over their step timeout so far, low word
+  base+9  CHECKPOINT  write 1: save the whole plant state; write 2: put
+                    the plant back to the last save (or to the plant as
+                    started). The command runs on the physics thread
+                    between two steps; the write response is sent once it
+                    is done, and the server keeps answering other
+                    requests meanwhile (ControlDeviceContext). Reads
+                    return the last command written. Not served with
+                    --workers.
+
+The rest of the window is reserved for future commands. Addresses below
+the window are passed through to the regular holding register block.
+"""
+
+import asyncio
+
+from pymodbus.constants import ExcCodes
+from pymodbus.datastore import ModbusDeviceContext
+from pymodbus.datastore.store import BaseModbusDataBlock
+
+CONTROL_BASE = 0xFF00
+CONTROL_SIZE = 16
+
+REG_ADVANCE = 0
+REG_TICKS_HI = 1
+REG_TICKS_LO = 2
+REG_OVERRUNS_HI = 3
+REG_OVERRUNS_LO = 4
+REG_VIOLATIONS_HI = 5
+REG_VIOLATIONS_LO = 6
+REG_LATE_HI = 7
+REG_LATE_LO = 8
+REG_CHECKPOINT = 9
+
+CHECKPOINT_SAVE = 1
+CHECKPOINT_RESTORE = 2
+
+
+class ControlRegisterBlock(BaseModbusDataBlock):
+    """Holding register block with the simulator's control window on top."""
+
+    def __init__(self, inner, base=CONTROL_BASE):
+        self.inner = inner
+        self.base = base
+        self.address = inner.address
+        self.default_value = inner.default_value
+        self.sim = None
+        self.lockstep = False
+        self.last_advance = 0
+        self.last_checkpoint = 0
+
+    def attach(self, sim, lockstep):
+        """Route commands to sim; ADVANCE is only honoured when lockstep."""
+        self.sim = sim
+        self.lockstep = lockstep
+
+    def _offset(self, address):
+        # ModbusDeviceContext adds 1 to every wire address.
+        return address - 1 - self.base
+
+    def getValues(self, address, count=1):
+        start = self._offset(address)
+        if start + count <= 0:
+            return self.inner.getValues(address, count)
+        if start < 0 or start + count > CONTROL_SIZE:
+            return ExcCodes.ILLEGAL_ADDRESS
+        ticks = self.sim.tick_count if self.sim is not None else 0
+        overruns = self.sim.overruns if self.sim is not None else 0
+        violations = self.sim.violations if self.sim is not None else 0
+        late = self.sim.late_strokes if self.sim is not None else 0
+        window = [0] * CONTROL_SIZE
+        window[REG_ADVANCE] = self.last_advance
+        window[REG_CHECKPOINT] = self.last_checkpoint
+        window[REG_TICKS_HI] = (ticks >> 16) & 0xFFFF
+        window[REG_TICKS_LO] = ticks & 0xFFFF
+        window[REG_OVERRUNS_HI] = (overruns >> 16) & 0xFFFF
+        window[REG_OVERRUNS_LO] = overruns & 0xFFFF
+        window[REG_VIOLATIONS_HI] = (violations >> 16) & 0xFFFF
+        window[REG_VIOLATIONS_LO] = violations & 0xFFFF
+        window[REG_LATE_HI] = (late >> 16) & 0xFFFF
+        window[REG_LATE_LO] = late & 0xFFFF
+        return window[start : start + count]
+
+    def encode_read(self, address, count):
+        # The window is built per request; only the plain block below it
+        # has a pre-encoded fast path.
+        if self._offset(address) + count <= 0:
+            return self.inner.encode_read(address, count)
+        return None
+
+    def setValues(self, address, values):
+        result, done = self._write(address, values)
+        if done is not None:
+            done.result()
+        return result
+
+    async def async_setValues(self, address, values):
+        result, done = self._write(address, values)
+        if done is not None:
+            await asyncio.wrap_future(done)
+        return result
+
+    def _write(self, address, values):
+        """Store values; return (setValues result, future of a queued
+        checkpoint command or None)."""
+        if not isinstance(values, list):
+            values = [values]
+        start = self._offset(address)
+        if start + len(values) <= 0:
+            return self.inner.setValues(address, values), None
+        if start < 0 or start + len(values) > CONTROL_SIZE:
+            return ExcCodes.ILLEGAL_ADDRESS, None
+        done = None
+        for offset, value in enumerate(values, start):
+            if offset == REG_CHECKPOINT:
+                # The worker processes' SharedImage has no plant to restore.
+                if value not in (CHECKPOINT_SAVE, CHECKPOINT_RESTORE) or not hasattr(self.sim, "checkpoint"):
+                    return ExcCodes.ILLEGAL_VALUE, done
+                self.last_checkpoint = value
+                if value == CHECKPOINT_SAVE:
+                    done = self.sim.save_checkpoint()
+                else:
+                    done = self.sim.restore_checkpoint()
+                continue
+            if offset != REG_ADVANCE:
+                return ExcCodes.ILLEGAL_ADDRESS, done
+            if not self.lockstep or self.sim is None:
+                return ExcCodes.ILLEGAL_VALUE, done
+            self.last_advance = value
+            self.sim.advance(value)
+        return None, done
+
+    def reset(self):
+        self.inner.reset()
+        self.last_advance = 0
+        self.last_checkpoint = 0
+
+    def __str__(self):
+        return f"ControlRegisterBlock({self.inner}, base=0x{self.base:04X})"
+
+    def __iter__(self):
+        return iter(self.inner)
+
+
+class ControlDeviceContext(ModbusDeviceContext):
+    """ModbusDeviceContext whose writes await the datablock's async_setValues.
+
+    pymodbus' own async_setValues calls setValues, so a checkpoint command
+    waiting for the physics thread would block the server's event loop.
+    """
+
+    async def async_setValues(self, func_code, address, values):
+        # ModbusDeviceContext.setValues adds 1 to every wire address too.
+        return await self.store[self.decode(func_code)].async_setValues(address + 1, values)
@@ -0,0 +1,283 @@
+"""NumPy-backed Modbus datablocks.
+
+ModbusSequentialDataBlock keeps one Python bool per address in a list,
+and the tick loop used to build new lists for every read and write. The
+block below stores bits packed LSB-first in a NumPy uint8 array (the same
+bit order Modbus uses on the wire), so the full 65,536-address space costs
+8 KiB and range reads/writes are a handful of vectorized byte operations.
+
+RegisterDataBlock does the same for holding/input registers with a
+big-endian uint16 array, again the wire byte order.
+
+Interfaces:
+  - getValues/setValues: the pymodbus datablock protocol, which must hand
+    lists to the PDU encoder.
+  - read/write: NumPy arrays for the simulator, no per-element objects.
+  - encode_read: the FC 0x01-0x04 response payload (byte count + data)
+    cut straight from the wire-ordered buffer, for fastread.py.
+  - publish: double-buffered update for tables the simulator owns (DI, IR).
+    The next image is built in a back buffer and swapped in with a single
+    reference assignment, so a request always reads one complete tick,
+    never a mix of two. Readers take `self.bits` / `self.regs` exactly
+    once per request and need no lock. The back buffer only lags the
+    front in the span published last (plus in-place writes since), so a
+    publish copies that span forward instead of the whole table.
+  - watch: WatchedBitDataBlock (the coil table) reports each write that
+    changes bits to a callback, so the simulator gets FC 0x05/0x0F edges
+    as they are stored instead of rescanning the table every tick.
+"""
+
+import numpy as np
+from pymodbus.constants import ExcCodes
+from pymodbus.datastore.store import BaseModbusDataBlock
+
+# Full Modbus address space for one table.
+MAX_BITS = 65536
+MAX_REGS = 65536
+# Registers are stored in Modbus byte order.
+REG_DTYPE = np.dtype(">u2")
+
+
+def _widen(span, lo, hi):
+    """Smallest [lo, hi) range covering span and [lo, hi); (0, 0) is empty."""
+    if span[0] == span[1]:
+        return lo, hi
+    return min(span[0], lo), max(span[1], hi)
+
+
+def _store_bits(bits, start, values):
+    """Pack a bool array into a packed uint8 bit array at bit offset start."""
+    count = values.size
+    lo = start >> 3
+    hi = (start + count + 7) >> 3
+    off = start & 7
+    if off == 0 and count & 7 == 0:
+        bits[lo:hi] = np.packbits(values, bitorder="little")
+        return
+    window = np.unpackbits(bits[lo:hi], bitorder="little")
+    window[off : off + count] = values
+    bits[lo:hi] = np.packbits(window, bitorder="little")
+
+
+def _encode_bits(bits, start, count):
+    """Read response payload of bits [start, start+count) of a packed array."""
+    lo = start >> 3
+    hi = (start + count + 7) >> 3
+    size = (count + 7) >> 3
+    off = start & 7
+    window = bits[lo:hi]
+    if off:
+        # Shift the window down to bit 0: each output byte takes the top
+        # of one stored byte and the bottom of the next.
+        data = window[:size] >> off
+        data[: window.size - 1] |= window[1:] << (8 - off)
+    elif count & 7:
+        data = window.copy()
+    else:
+        return bytes((size,)) + window.data
+    if count & 7:
+        data[-1] &= (1 << (count & 7)) - 1
+    return bytes((size,)) + data.data
+
+
+class PackedBitDataBlock(BaseModbusDataBlock):
+    """Coil / discrete input table backed by a packed uint8 bit array."""
+
+    def __init__(self, count=MAX_BITS, value=False):
+        # ModbusDeviceContext adds 1 to every address before it reaches the
+        # block; starting the block at 1 makes bit index == wire address.
+        self.address = 1
+        self.count = count
+        self.default_value = bool(value)
+        self.bits = np.zeros((count + 7) // 8, dtype=np.uint8)
+        self._back = np.zeros_like(self.bits)
+        # Bytes where _back differs from bits.
+        self._stale = (0, 0)
+        self.reset()
+
+    def reset(self):
+        """Reset every bit to the default value."""
+        self.bits.fill(0xFF if self.default_value else 0x00)
+        self._stale = (0, self.bits.size)
+
+    def read(self, start, count):
+        """Return bits [start, start+count) as a NumPy bool array."""
+        lo = start >> 3
+        hi = (start + count + 7) >> 3
+        off = start & 7
+        window = np.unpackbits(self.bits[lo:hi], bitorder="little")
+        return window[off : off + count].view(bool)
+
+    def encode_read(self, address, count):
+        """Return the FC 0x01/0x02 response payload, or None if out of range.
+
+        :param address: The starting address (pymodbus datablock addressing)
+        :param count: The number of bits to read
+        """
+        start = address - self.address
+        if start < 0 or start + count > self.count:
+            return None
+        return _encode_bits(self.bits, start, count)
+
+    def publish(self, values, start=0):
+        """Swap in a new image with bits [start, start+len(values)) replaced."""
+        values = np.asarray(values, dtype=bool)
+        front = self.bits
+        back = self._back
+        lo, hi = self._stale
+        back[lo:hi] = front[lo:hi]
+        _store_bits(back, start, values)
+        self.bits = back
+        self._back = front
+        self._stale = (start >> 3, (start + values.size + 7) >> 3)
+
+    def write(self, start, values):
+        """Store a bool array-like at bits [start, start+len(values)) in place."""
+        values = np.asarray(values, dtype=bool)
+        _store_bits(self.bits, start, values)
+        self._stale = _widen(self._stale, start >> 3, (start + values.size + 7) >> 3)
+
+    def getValues(self, address, count=1):
+        """Return the requested bits as a list (pymodbus datablock protocol).
+
+        :param address: The starting address
+        :param count: The number of values to retrieve
+        """
+        start = address - self.address
+        if start < 0 or start + count > self.count:
+            return ExcCodes.ILLEGAL_ADDRESS
+        return self.read(start, count).tolist()
+
+    def setValues(self, address, values):
+        """Store the supplied bits (pymodbus datablock protocol).
+
+        :param address: The starting address
+        :param values: The new values to be set
+        """
+        if not isinstance(values, list):
+            values = [values]
+        start = address - self.address
+        if start < 0 or start + len(values) > self.count:
+            return ExcCodes.ILLEGAL_ADDRESS
+        self.write(start, values)
+        return None
+
+    def __str__(self):
+        return f"PackedBitDataBlock({self.count}, {self.default_value})"
+
+    def __iter__(self):
+        return enumerate(self.read(0, self.count).tolist(), 0)
+
+
+class WatchedBitDataBlock(PackedBitDataBlock):
+    """PackedBitDataBlock that reports changed bits to a callback on write."""
+
+    def __init__(self, count=MAX_BITS, value=False):
+        self.on_change = None
+        super().__init__(count, value)
+
+    def watch(self, callback):
+        """Call callback(start, values) after every write that changes bits.
+
+        One call per write (a whole FC 0x0F request), narrowed to the first
+        to last changed bit; values is a bool array owned by the callee.
+        """
+        self.on_change = callback
+
+    def write(self, start, values):
+        values = np.asarray(values, dtype=bool)
+        callback = self.on_change
+        if callback is None:
+            super().write(start, values)
+            return
+        changed = np.flatnonzero(self.read(start, values.size) != values)
+        super().write(start, values)
+        if changed.size:
+            lo, hi = changed[0], changed[-1] + 1
+            callback(start + int(lo), values[lo:hi].copy())
+
+    def __str__(self):
+        return f"WatchedBitDataBlock({self.count}, {self.default_value})"
+
+
+class RegisterDataBlock(BaseModbusDataBlock):
+    """Holding / input register table backed by a uint16 array."""
+
+    def __init__(self, count=MAX_REGS, value=0):
+        # Same +1 shift compensation as PackedBitDataBlock.
+        self.address = 1
+        self.count = count
+        self.default_value = value
+        self.regs = np.full(count, value, dtype=REG_DTYPE)
+        self._back = self.regs.copy()
+        # Registers where _back differs from regs.
+        self._stale = (0, 0)
+
+    def reset(self):
+        """Reset every register to the default value."""
+        self.regs.fill(self.default_value)
+        self._stale = (0, self.count)
+
+    def read(self, start, count):
+        """Return registers [start, start+count) as a big-endian uint16 array view."""
+        return self.regs[start : start + count]
+
+    def encode_read(self, address, count):
+        """Return the FC 0x03/0x04 response payload, or None if out of range.
+
+        :param address: The starting address (pymodbus datablock addressing)
+        :param count: The number of registers to read
+        """
+        start = address - self.address
+        if start < 0 or start + count > self.count:
+            return None
+        return bytes((2 * count,)) + self.regs[start : start + count].data
+
+    def write(self, start, values):
+        """Store values at registers [start, start+len(values)) in place."""
+        values = np.asarray(values, dtype=np.uint16)
+        self.regs[start : start + values.size] = values
+        self._stale = _widen(self._stale, start, start + values.size)
+
+    def publish(self, values, start=0):
+        """Swap in a new image with registers [start, start+len(values)) replaced."""
+        values = np.asarray(values, dtype=np.uint16)
+        front = self.regs
+        back = self._back
+        lo, hi = self._stale
+        back[lo:hi] = front[lo:hi]
+        back[start : start + values.size] = values
+        self.regs = back
+        self._back = front
+        self._stale = (start, start + values.size)
+
+    def getValues(self, address, count=1):
+        """Return the requested registers as a list (pymodbus datablock protocol).
+
+        :param address: The starting address
+        :param count: The number of values to retrieve
+        """
+        start = address - self.address
+        if start < 0 or start + count > self.count:
+            return ExcCodes.ILLEGAL_ADDRESS
+        return self.regs[start : start + count].tolist()
+
+    def setValues(self, address, values):
+        """Store the supplied registers (pymodbus datablock protocol).
+
+        :param address: The starting address
+        :param values: The new values to be set
+        """
+        if not isinstance(values, list):
+            values = [values]
+        start = address - self.address
+        if start < 0 or start + len(values) > self.count:
+            return ExcCodes.ILLEGAL_ADDRESS
+        self.write(start, values)
+        return None
+
+    def __str__(self):
+        return f"RegisterDataBlock({self.count}, {self.default_value})"
+
+    def __iter__(self):
+        return enumerate(self.regs.tolist(), 0)
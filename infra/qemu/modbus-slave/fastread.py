@@ -0,0 +1,79 @@
+"""Pre-encoded responses for range reads (FC 0x01/0x02/0x03/0x04).
+
+pymodbus serves a read by asking the datablock for a list of Python bools
+or ints and packing that list element by element in the response PDU's
+encode(). The tables of datablock.py are already stored in wire order
+(bits packed LSB-first, registers big-endian), so the request classes
+below ask the block for the finished payload instead: the byte count plus
+a slice of the front buffer, one vectorized copy whatever the range size.
+The RustPLC runtime reads each table in one request up to its highest
+mapped address, and such full-table polls cost a few microseconds.
+
+Requests the block cannot serve this way (the control window, addresses
+out of range, counts outside the spec, blocks without encode_read) take
+pymodbus' generic path, so responses and exception codes are unchanged.
+Register the classes with a server through `custom_pdu=READ_REQUESTS`.
+"""
+
+from pymodbus.pdu import ModbusPDU
+from pymodbus.pdu.bit_message import ReadCoilsRequest, ReadDiscreteInputsRequest
+from pymodbus.pdu.register_message import ReadHoldingRegistersRequest, ReadInputRegistersRequest
+
+# Modbus application protocol V1.1b3, 6.1-6.4: largest quantity per read.
+MAX_READ_BITS = 2000
+MAX_READ_REGS = 125
+
+
+class EncodedReadResponse(ModbusPDU):
+    """Read response whose payload was encoded by the datablock."""
+
+    def __init__(self, function_code, payload, dev_id=0, transaction_id=0):
+        super().__init__(dev_id=dev_id, transaction_id=transaction_id)
+        self.function_code = function_code
+        self.payload = payload
+
+    def encode(self):
+        return self.payload
+
+    def decode(self, data):
+        self.payload = bytes(data)
+
+
+class _EncodedRead:
+    """update_datastore that asks the block for the encoded payload."""
+
+    max_count = 0
+
+    async def update_datastore(self, context):
+        if 1 <= self.count <= self.max_count:
+            block = context.store[context.decode(self.function_code)]
+            encode_read = getattr(block, "encode_read", None)
+            # ModbusDeviceContext adds 1 to every address; so do we.
+            payload = encode_read(self.address + 1, self.count) if encode_read else None
+            if payload is not None:
+                return EncodedReadResponse(self.function_code, payload, self.dev_id, self.transaction_id)
+        return await super().update_datastore(context)
+
+
+class EncodedReadCoilsRequest(_EncodedRead, ReadCoilsRequest):
+    max_count = MAX_READ_BITS
+
+
+class EncodedReadDiscreteInputsRequest(_EncodedRead, ReadDiscreteInputsRequest):
+    max_count = MAX_READ_BITS
+
+
+class EncodedReadHoldingRegistersRequest(_EncodedRead, ReadHoldingRegistersRequest):
+    max_count = MAX_READ_REGS
+
+
+class EncodedReadInputRegistersRequest(_EncodedRead, ReadInputRegistersRequest):
+    max_count = MAX_READ_REGS
+
+
+READ_REQUESTS = [
+    EncodedReadCoilsRequest,
+    EncodedReadDiscreteInputsRequest,
+    EncodedReadHoldingRegistersRequest,
+    EncodedReadInputRegistersRequest,
+]
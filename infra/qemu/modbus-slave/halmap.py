@@ -0,0 +1,332 @@
+"""Address map loaded from a RustPLC HAL TOML file (config/hal_*.toml).
+
+The `[mapping.coils]`, `[mapping.discrete_inputs]`,
+`[mapping.holding_registers]` and `[mapping.input_registers]` tables are
+parsed once at startup and precomputed into NumPy index arrays, so each
+tick gathers coils and scatters sensors with a single fancy-indexing
+operation instead of one datastore call per device.
+
+Without a plant model (see plcmodel.py), cylinder roles are taken from
+the device names (same suffixes as the classic valve_extend /
+valve_retract / sensor_home / sensor_end map):
+  - coils ending in "extend" / "retract"        → extend / retract valve
+  - discrete inputs ending in "home" / "end"    → home / end sensor
+The k-th extend coil, retract coil, home sensor and end sensor (in file
+order) form cylinder k. A missing role is index -1, which points at a
+spare always-False slot past the end of the image. Names that match no
+role are still served at their address but not simulated.
+
+Motors are bound the same way: a coil is a motor when discrete inputs
+named "<coil>_position_<P>" exist, each a position sensor of that motor
+(see MotorBinding).
+"""
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
+
+import numpy as np
+
+MAPPING_TABLES = ("coils", "discrete_inputs", "holding_registers", "input_registers")
+
+MAX_ADDRESS = 0xFFFF
+
+# Motors without rated_speed turn at this speed.
+DEFAULT_RPM = 60.0
+# Angular width of a position sensor's window, in revolutions (10 degrees).
+POSITION_WINDOW = 1.0 / 36
+POSITION_SUFFIX = "_position_"
+
+
+def _role(names, suffix):
+    return [addr for name, addr in names.items() if name.endswith(suffix)]
+
+
+def _index(addrs, count):
+    """Pad an address list with -1 up to count entries."""
+    return np.array(list(addrs) + [-1] * (count - len(addrs)), dtype=np.intp)
+
+
+class CylinderBinding:
+    """Flat per-cylinder table: coil/DI indices and timing constants.
+
+    Index -1 means "not mapped" and points at the spare slot of the image.
+    valve_retract = coil[retract_coil] ^ retract_invert, which also covers
+    monostable valves (retract_coil == extend_coil, retract_invert set).
+    Timings are in ms; NaN means "use the simulator's default threshold".
+    extend_ms / retract_ms run from the valve command to the far sensor
+    reporting; response_ms and the sensor debounce times (default 0) only
+    feed the exact timing model (see timing_ns).
+    """
+
+    def __init__(self, names, extend_coil, retract_coil, home_di, end_di,
+                 retract_invert=None, home_invert=None, end_invert=None,
+                 extend_ms=None, retract_ms=None, response_ms=None,
+                 home_debounce_ms=None, end_debounce_ms=None):
+        count = len(names)
+        self.names = list(names)
+        self.count = count
+        self.extend_coil = _index(extend_coil, count)
+        self.retract_coil = _index(retract_coil, count)
+        self.home_di = _index(home_di, count)
+        self.end_di = _index(end_di, count)
+        self.retract_invert = _flags(retract_invert, count)
+        self.home_invert = _flags(home_invert, count)
+        self.end_invert = _flags(end_invert, count)
+        self.extend_ms = _timings(extend_ms, count)
+        self.retract_ms = _timings(retract_ms, count)
+        self.response_ms = _delays(response_ms, count)
+        self.home_debounce_ms = _delays(home_debounce_ms, count)
+        self.end_debounce_ms = _delays(end_debounce_ms, count)
+
+    @classmethod
+    def concat(cls, parts):
+        """Join per-unit bindings into one binding over concatenated images.
+
+        :param parts: (binding, name_prefix, coil_offset, coil_span, di_offset,
+            di_span) tuples; a unit's image occupies [offset, offset+span] of
+            the joint image, with its spare slot at offset+span
+        """
+        names, extend, retract, home, end = [], [], [], [], []
+        for binding, prefix, coil_offset, coil_span, di_offset, di_span in parts:
+            names += [prefix + name for name in binding.names]
+            extend.append(_shift(binding.extend_coil, coil_offset, coil_span))
+            retract.append(_shift(binding.retract_coil, coil_offset, coil_span))
+            home.append(_shift(binding.home_di, di_offset, di_span))
+            end.append(_shift(binding.end_di, di_offset, di_span))
+        bindings = [part[0] for part in parts]
+        return cls(
+            names,
+            np.concatenate(extend),
+            np.concatenate(retract),
+            np.concatenate(home),
+            np.concatenate(end),
+            retract_invert=np.concatenate([b.retract_invert for b in bindings]),
+            home_invert=np.concatenate([b.home_invert for b in bindings]),
+            end_invert=np.concatenate([b.end_invert for b in bindings]),
+            extend_ms=np.concatenate([b.extend_ms for b in bindings]),
+            retract_ms=np.concatenate([b.retract_ms for b in bindings]),
+            response_ms=np.concatenate([b.response_ms for b in bindings]),
+            home_debounce_ms=np.concatenate([b.home_debounce_ms for b in bindings]),
+            end_debounce_ms=np.concatenate([b.end_debounce_ms for b in bindings]),
+        )
+
+    def ticks(self, cycle_ms, default_ticks):
+        """Return (extend_ticks, retract_ticks) int32 arrays for cycle_ms."""
+        return (
+            _to_ticks(self.extend_ms, cycle_ms, default_ticks),
+            _to_ticks(self.retract_ms, cycle_ms, default_ticks),
+        )
+
+    def timing_ns(self, cycle_ms, default_ticks):
+        """Return int64 ns arrays (extend, retract, home_fall, end_fall).
+
+        home_fall is the time from the extend command until the home sensor
+        drops (valve response + home debounce), end_fall the same for the
+        end sensor on retract; neither exceeds the full stroke.
+        """
+        default_ms = default_ticks * cycle_ms
+        extend = _to_ns(np.where(np.isnan(self.extend_ms), default_ms, self.extend_ms))
+        retract = _to_ns(np.where(np.isnan(self.retract_ms), default_ms, self.retract_ms))
+        home_fall = np.minimum(_to_ns(self.response_ms + self.home_debounce_ms), extend)
+        end_fall = np.minimum(_to_ns(self.response_ms + self.end_debounce_ms), retract)
+        return extend, retract, home_fall, end_fall
+
+
+class MotorBinding:
+    """Flat per-motor and per-position-sensor tables.
+
+    Motor m is switched by coil[coil[m]] and turns at rated_rpm, reaching
+    it (and stopping) over ramp_ms. Position sensor s reports on
+    di[sensor_di[s]] while motor sensor_motor[s] is within its window;
+    sensor_slot[s] is its rank among the motor's sensors, which sit evenly
+    spaced around the turn (see layout).
+    """
+
+    def __init__(self, names, coil, rated_rpm=None, ramp_ms=None, sensor_names=(),
+                 sensor_di=(), sensor_motor=(), sensor_slot=(), sensor_invert=None):
+        count = len(names)
+        sensors = len(sensor_names)
+        self.names = list(names)
+        self.count = count
+        self.coil = _index(coil, count)
+        if rated_rpm is None:
+            rated_rpm = np.full(count, DEFAULT_RPM)
+        self.rated_rpm = np.array(rated_rpm, dtype=np.float64)
+        self.ramp_ms = _delays(ramp_ms, count)
+        self.sensor_names = list(sensor_names)
+        self.sensors = sensors
+        self.sensor_di = _index(sensor_di, sensors)
+        self.sensor_motor = np.array(sensor_motor, dtype=np.intp)
+        self.sensor_slot = np.array(sensor_slot, dtype=np.intp)
+        self.sensor_invert = _flags(sensor_invert, sensors)
+
+    @classmethod
+    def concat(cls, parts):
+        """Join per-unit bindings like CylinderBinding.concat (same parts)."""
+        names, coil, sensor_names, sensor_di, sensor_motor = [], [], [], [], []
+        motors = 0
+        for binding, prefix, coil_offset, coil_span, di_offset, di_span in parts:
+            names += [prefix + name for name in binding.names]
+            sensor_names += [prefix + name for name in binding.sensor_names]
+            coil.append(_shift(binding.coil, coil_offset, coil_span))
+            sensor_di.append(_shift(binding.sensor_di, di_offset, di_span))
+            sensor_motor.append(binding.sensor_motor + motors)
+            motors += binding.count
+        bindings = [part[0] for part in parts]
+        return cls(
+            names,
+            np.concatenate(coil),
+            rated_rpm=np.concatenate([b.rated_rpm for b in bindings]),
+            ramp_ms=np.concatenate([b.ramp_ms for b in bindings]),
+            sensor_names=sensor_names,
+            sensor_di=np.concatenate(sensor_di),
+            sensor_motor=np.concatenate(sensor_motor),
+            sensor_slot=np.concatenate([b.sensor_slot for b in bindings]),
+            sensor_invert=np.concatenate([b.sensor_invert for b in bindings]),
+        )
+
+    def layout(self, width=POSITION_WINDOW):
+        """Return (window start, window width, initial angle) arrays in revolutions.
+
+        The k-th of a motor's n sensors is centred at k/n of a turn; motors
+        start half a spacing before their first window, between two
+        positions rather than on one.
+        """
+        per_motor = np.bincount(self.sensor_motor, minlength=self.count)
+        spacing = 1.0 / np.maximum(per_motor, 1)
+        start = (self.sensor_slot * spacing[self.sensor_motor] - width / 2) % 1.0
+        return start, np.full(self.sensors, width), (-spacing / 2) % 1.0
+
+
+def _shift(index, offset, span):
+    """Move local indices into a joint image; -1 becomes the unit's spare slot."""
+    return np.where(index >= 0, index + offset, offset + span)
+
+
+def _flags(values, count):
+    return np.zeros(count, dtype=bool) if values is None else np.array(values, dtype=bool)
+
+
+def _timings(values, count):
+    return np.full(count, np.nan) if values is None else np.array(values, dtype=np.float64)
+
+
+def _delays(values, count):
+    return np.zeros(count) if values is None else np.array(values, dtype=np.float64)
+
+
+def _to_ns(ms):
+    return np.maximum(np.round(ms * 1e6), 0).astype(np.int64)
+
+
+def _to_ticks(ms, cycle_ms, default_ticks):
+    ticks = np.where(np.isnan(ms), default_ticks, np.ceil(ms / cycle_ms))
+    return np.maximum(ticks, 1).astype(np.int32)
+
+
+class HalMap:
+    """Device name → Modbus address tables of one HAL config."""
+
+    def __init__(self, coils, discrete_inputs, holding_registers=None, input_registers=None,
+                 source="builtin", slave_id=1, baud_rate=None, analog=None):
+        self.source = source
+        self.slave_id = slave_id
+        self.baud_rate = baud_rate
+        # [simulation.analog.*] tables, compiled by analog.load_analog.
+        self.analog = dict(analog or {})
+        self.coils = dict(coils)
+        self.discrete_inputs = dict(discrete_inputs)
+        self.holding_registers = dict(holding_registers or {})
+        self.input_registers = dict(input_registers or {})
+
+        for table in MAPPING_TABLES:
+            for name, addr in getattr(self, table).items():
+                if not isinstance(addr, int) or not 0 <= addr <= MAX_ADDRESS:
+                    raise ValueError(f"{source}: mapping.{table}.{name} = {addr!r} is not a Modbus address")
+
+        # Images cover 0..max address; index -1 lands on the spare slot.
+        self.coil_span = max(self.coils.values(), default=-1) + 1
+        self.di_span = max(self.discrete_inputs.values(), default=-1) + 1
+
+    def suffix_binding(self):
+        """Bind cylinders by the extend/retract/home/end name suffixes."""
+        extend = _role(self.coils, "extend")
+        retract = _role(self.coils, "retract")
+        home = _role(self.discrete_inputs, "home")
+        end = _role(self.discrete_inputs, "end")
+        count = max(len(extend), len(retract), len(home), len(end))
+        return CylinderBinding([f"cyl{i}" for i in range(count)], extend, retract, home, end)
+
+    def suffix_motors(self):
+        """Bind motors by the "<coil>_position_<P>" discrete input names."""
+        positions = {}
+        for di_name, di_addr in self.discrete_inputs.items():
+            motor, found, position = di_name.rpartition(POSITION_SUFFIX)
+            if found:
+                positions.setdefault(motor, []).append((position, di_addr))
+
+        names, coil, sensor_names, sensor_di, sensor_motor, sensor_slot = [], [], [], [], [], []
+        for name, addr in self.coils.items():
+            if name not in positions:
+                continue
+            for slot, (position, di_addr) in enumerate(sorted(positions[name])):
+                sensor_names.append(f"{name}.position_{position}")
+                sensor_di.append(di_addr)
+                sensor_motor.append(len(names))
+                sensor_slot.append(slot)
+            names.append(name)
+            coil.append(addr)
+        return MotorBinding(names, coil, sensor_names=sensor_names, sensor_di=sensor_di,
+                            sensor_motor=sensor_motor, sensor_slot=sensor_slot)
+
+    def unbound(self, binding, motors=None):
+        """Names served at their address but not driven by the bindings."""
+        bound = set(binding.extend_coil.tolist()) | set(binding.retract_coil.tolist())
+        if motors is not None:
+            bound |= set(motors.coil.tolist())
+        names = [f"coil {n}={a}" for n, a in self.coils.items() if a not in bound]
+        bound = set(binding.home_di.tolist()) | set(binding.end_di.tolist())
+        if motors is not None:
+            bound |= set(motors.sensor_di.tolist())
+        names += [f"di {n}={a}" for n, a in self.discrete_inputs.items() if a not in bound]
+        return names
+
+    @classmethod
+    def default(cls, cylinders=1, motors=0):
+        """Stride-2 layout: cylinder i at coils/DIs 2i and 2i+1.
+
+        Cylinder 0 uses the names of config/hal_modbus_tcp.toml. Motor j
+        follows at coil 2*cylinders + j with its position_A / position_B
+        sensors at DIs 2*cylinders + 2j and 2*cylinders + 2j + 1.
+        """
+        coils = {}
+        discrete_inputs = {}
+        for i in range(cylinders):
+            prefix = "" if i == 0 else f"cyl{i}_"
+            coils[f"{prefix}valve_extend"] = 2 * i
+            coils[f"{prefix}valve_retract"] = 2 * i + 1
+            discrete_inputs[f"{prefix}sensor_home"] = 2 * i
+            discrete_inputs[f"{prefix}sensor_end"] = 2 * i + 1
+        for j in range(motors):
+            coils[f"motor{j}"] = 2 * cylinders + j
+            discrete_inputs[f"motor{j}_position_A"] = 2 * cylinders + 2 * j
+            discrete_inputs[f"motor{j}_position_B"] = 2 * cylinders + 2 * j + 1
+        source = f"builtin({cylinders} cylinders, {motors} motors)" if motors else f"builtin({cylinders} cylinders)"
+        return cls(coils, discrete_inputs, source=source)
+
+
+def load_hal_map(path):
+    """Parse the [mapping.*] tables of a HAL TOML file into a HalMap."""
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    mapping = config.get("mapping", {})
+    modbus = config.get("modbus", {})
+    return HalMap(
+        *(mapping.get(table, {}) for table in MAPPING_TABLES),
+        source=str(path),
+        slave_id=modbus.get("slave_id", 1),
+        baud_rate=modbus.get("baud_rate"),
+        analog=config.get("simulation", {}).get("analog"),
+    )
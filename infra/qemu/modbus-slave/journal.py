@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Binary edge journal of coil writes and sensor transitions.
+
+Every tick the simulator compares its coil and DI images with the previous
+tick and appends one fixed-size record per changed bit to a ring of
+records in a memory-mapped file. Capturing is a vectorized compare plus a
+slice store into the page cache: no formatting, no syscalls.
+
+File layout (little-endian):
+  header  64 bytes: magic "RPLCJRN1", uint32 version, uint32 record size,
+          uint64 capacity, uint64 records written, float64 cycle_ms,
+          uint32 time base (0: monotonic ns, 1: plant ns)
+  ring    capacity x RECORD_DTYPE; record i lives in slot i % capacity
+
+Record: tick (uint64), ns (uint64), address (uint16), unit ID (uint8),
+table (0 = coil, 1 = discrete input), old and new value (uint8). ns is
+time.monotonic_ns(), or plant time for --timing exact / event clock
+journals, whose coil writes and sensor edges do not fall on ticks.
+
+Coil edges are taken at the start of the tick that read them, sensor edges
+after the tick published them, so feeding the coil records of tick t back
+before tick t reproduces the plant exactly (see modbus_slave.py --replay).
+
+Usage:
+  python3 journal.py slave.journal [--table coil|di]   # dump as text
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+MAGIC = b"RPLCJRN1"
+VERSION = 1
+HEADER_SIZE = 64
+DEFAULT_CAPACITY = 1 << 18
+
+TIME_MONOTONIC = 0
+TIME_PLANT = 1
+
+TABLE_COIL = 0
+TABLE_DI = 1
+TABLE_NAMES = {TABLE_COIL: "coil", TABLE_DI: "di"}
+
+RECORD_DTYPE = np.dtype([
+    ("tick", "<u8"),
+    ("ns", "<u8"),
+    ("address", "<u2"),
+    ("unit", "u1"),
+    ("table", "u1"),
+    ("old", "u1"),
+    ("new", "u1"),
+    ("pad", "V2"),
+])
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("record_size", "<u4"),
+    ("capacity", "<u8"),
+    ("written", "<u8"),
+    ("cycle_ms", "<f8"),
+    ("time_base", "<u4"),
+    ("reserved", "V20"),
+])
+
+assert RECORD_DTYPE.itemsize == 24 and HEADER_DTYPE.itemsize == HEADER_SIZE
+
+
+class Journal:
+    """Edge detector over joint coil/DI images writing into a record ring.
+
+    coil_units / coil_addresses (and the di_ pair) give the unit ID and
+    Modbus address of every slot of the joint images; path None keeps the
+    ring in memory.
+    """
+
+    def __init__(self, path, cycle_ms, coil_units, coil_addresses, di_units, di_addresses,
+                 capacity=DEFAULT_CAPACITY, time_base=TIME_MONOTONIC):
+        size = HEADER_SIZE + capacity * RECORD_DTYPE.itemsize
+        if path is None:
+            buffer = np.zeros(size, dtype=np.uint8)
+        else:
+            buffer = np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,))
+        self._buffer = buffer
+        self.header = buffer[:HEADER_SIZE].view(HEADER_DTYPE)[0:1]
+        self.ring = buffer[HEADER_SIZE:].view(RECORD_DTYPE)
+        self.header["magic"] = MAGIC
+        self.header["version"] = VERSION
+        self.header["record_size"] = RECORD_DTYPE.itemsize
+        self.header["capacity"] = capacity
+        self.header["written"] = 0
+        self.header["cycle_ms"] = cycle_ms
+        self.header["time_base"] = time_base
+        self.capacity = capacity
+
+        self._maps = {
+            TABLE_COIL: (np.asarray(coil_units), np.asarray(coil_addresses)),
+            TABLE_DI: (np.asarray(di_units), np.asarray(di_addresses)),
+        }
+        self._previous = {
+            TABLE_COIL: np.zeros(len(coil_units), dtype=bool),
+            TABLE_DI: np.zeros(len(di_units), dtype=bool),
+        }
+
+    @property
+    def written(self):
+        return int(self.header["written"][0])
+
+    def prime(self, table, image):
+        """Set the reference image without recording (initial plant state)."""
+        self._previous[table][:] = image
+
+    def capture(self, tick, ns, table, image):
+        """Record every bit of image that differs from the last capture."""
+        previous = self._previous[table]
+        changed = np.flatnonzero(image != previous)
+        if changed.size:
+            units, addresses = self._maps[table]
+            records = np.zeros(changed.size, dtype=RECORD_DTYPE)
+            records["tick"] = tick
+            records["ns"] = ns
+            records["address"] = addresses[changed]
+            records["unit"] = units[changed]
+            records["table"] = table
+            records["old"] = previous[changed]
+            records["new"] = image[changed]
+            self._append(records)
+            previous[changed] = image[changed]
+
+    def _append(self, records):
+        written = self.written
+        if records.size > self.capacity:
+            written += records.size - self.capacity
+            records = records[-self.capacity :]
+        slots = (written + np.arange(records.size)) % self.capacity
+        self.ring[slots] = records
+        self.header["written"] = written + records.size
+
+    def records(self):
+        """Surviving records, oldest first."""
+        return _ordered(self.ring, self.written, self.capacity)
+
+    def close(self):
+        if isinstance(self._buffer, np.memmap):
+            self._buffer.flush()
+
+
+def _ordered(ring, written, capacity):
+    if written <= capacity:
+        return ring[:written].copy()
+    start = written % capacity
+    return np.concatenate([ring[start:], ring[:start]])
+
+
+def load_journal(path):
+    """Read a journal file.
+
+    :returns: (header record, records oldest first, number of records lost
+              to ring wraparound)
+    """
+    buffer = np.fromfile(path, dtype=np.uint8)
+    header = buffer[:HEADER_SIZE].view(HEADER_DTYPE)[0]
+    if header["magic"] != MAGIC or header["record_size"] != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path}: not an edge journal (version {VERSION})")
+    capacity = int(header["capacity"])
+    written = int(header["written"])
+    ring = buffer[HEADER_SIZE : HEADER_SIZE + capacity * RECORD_DTYPE.itemsize].view(RECORD_DTYPE)
+    return header, _ordered(ring, written, capacity), max(0, written - capacity)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump a modbus_slave.py edge journal")
+    parser.add_argument("path", help="Journal file written with modbus_slave.py --journal")
+    parser.add_argument("--table", choices=("coil", "di"), help="Only show one table")
+    args = parser.parse_args()
+
+    header, records, lost = load_journal(args.path)
+    print(f"# {os.path.basename(args.path)}: cycle {header['cycle_ms']:g}ms, "
+          f"{records.size} records, {lost} lost to wraparound")
+    if args.table:
+        records = records[records["table"] == (TABLE_COIL if args.table == "coil" else TABLE_DI)]
+    out = sys.stdout
+    for rec in records:
+        out.write("%8d %16d u%-3d %-4s %5d %d -> %d\n" % (
+            rec["tick"], rec["ns"], rec["unit"], TABLE_NAMES[int(rec["table"])],
+            rec["address"], rec["old"], rec["new"],
+        ))
+
+
+if __name__ == "__main__":
+    main()
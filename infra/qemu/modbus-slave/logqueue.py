@@ -0,0 +1,122 @@
+"""Non-blocking logging for the tick and request paths.
+
+logging.basicConfig writes every record synchronously to stderr, which
+systemd hands to journald; a slow journal then stalls whichever thread
+logged, including the physics tick. Here the root logger only gets a
+QueueHandler that appends the record to a bounded ring and returns. A
+QueueListener thread formats and writes the records.
+
+  - Bounded: when the ring is full the oldest record is overwritten and a
+    drop counter is bumped; the listener reports the drops it has seen.
+  - Lazy: QueueHandler normally formats each record in the caller's
+    thread; RingQueueHandler hands the record over as is, so message %
+    args formatting happens on the listener thread. Log arguments must not
+    be mutated after the call (pass ints / NumPy scalars, not arrays).
+  - Fork-safe: forked --workers processes get a fresh ring and listener.
+"""
+
+import atexit
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+LOG_QUEUE_SIZE = 4096
+
+_listener = None
+
+
+class RingQueue:
+    """Bounded queue whose put never blocks; overflow drops the oldest item."""
+
+    def __init__(self, capacity=LOG_QUEUE_SIZE):
+        self.capacity = capacity
+        self.dropped = 0
+        self._items = collections.deque(maxlen=capacity)
+        self._ready = threading.Event()
+
+    def put_nowait(self, item):
+        if len(self._items) == self.capacity:
+            self.dropped += 1
+        self._items.append(item)
+        # Event.set takes a lock; skip it while the listener is still awake.
+        if not self._ready.is_set():
+            self._ready.set()
+
+    def get(self, block=True, timeout=None):
+        while True:
+            try:
+                return self._items.popleft()
+            except IndexError:
+                if not block:
+                    raise queue.Empty from None
+            if not self._ready.wait(timeout):
+                raise queue.Empty
+            self._ready.clear()
+
+
+class RingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers formatting to the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+class RingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that reports records dropped by the ring."""
+
+    def __init__(self, ring, *handlers):
+        super().__init__(ring, *handlers)
+        self._reported = 0
+
+    def handle(self, record):
+        dropped = self.queue.dropped
+        if dropped != self._reported:
+            notice = logging.LogRecord(
+                "logqueue", logging.WARNING, __file__, 0,
+                "log queue full: dropped %d records", (dropped - self._reported,), None,
+            )
+            self._reported = dropped
+            super().handle(notice)
+        super().handle(record)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(level=logging.INFO, capacity=LOG_QUEUE_SIZE):
+    """Route the root logger through a ring and start its listener thread.
+
+    Records still in the ring are flushed at interpreter exit.
+    """
+    # LOG_FORMAT needs none of these; skip collecting them per record.
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False  # Python 3.12+
+    # Caller lookup (a stack walk per record) has no public switch; the
+    # logging HOWTO's "Optimization" section documents clearing _srcfile.
+    # Checked on CPython 3.10-3.13.
+    if hasattr(logging, "_srcfile"):
+        logging._srcfile = None
+
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def start():
+        global _listener
+        ring = RingQueue(capacity)
+        root = logging.getLogger()
+        root.handlers[:] = [RingQueueHandler(ring)]
+        root.setLevel(level)
+        _listener = RingQueueListener(ring, output)
+        _listener.start()
+
+    start()
+    # The listener thread does not survive fork(); give each child its own.
+    os.register_at_fork(after_in_child=start)
+    atexit.register(lambda: _listener.stop())
@@ -0,0 +1,289 @@
+"""Request and tick instrumentation with a Prometheus text endpoint.
+
+All counters live in NumPy arrays allocated once at startup and indexed
+by function code (0..127) and latency bucket, so recording a request is a
+handful of integer operations on preallocated arrays. The arrays have
+a leading "row" axis: every process that records (the physics process and
+each --workers server process) owns one row, and the exporter sums rows.
+With --workers the arrays are placed in a shared_memory segment.
+
+Latency buckets are HDR-style log-linear: exact microseconds below 16 us,
+then 8 sub-buckets per power of two (relative error <= 12.5 %), up to
+about two minutes.
+
+Recorded per function code: requests, exception responses, request and
+response bytes, handling latency (request decoded → response encoded, so
+network time is excluded). Recorded per tick: duration of the physics
+step and jitter (start of the tick minus its deadline). Other objects
+with a render() returning Prometheus lines (the safety and timing
+monitors) can be added to MetricsExporter.sources; they are rendered in
+the exporter's process.
+
+The server side is hooked through pymodbus' trace_packet / trace_pdu
+callbacks, which every connection shares. Instead of matching responses
+to requests (transaction IDs repeat across clients, and a request for an
+ignored unit ID is never answered), trace_pdu wraps each decoded
+request's own update_datastore so the response it returns carries the
+request's function code and decode time. Responses pymodbus builds
+without the datastore (unknown unit ID) are counted but not timed.
+trace_packet parses Modbus TCP (MBAP) frames; the RTU server (rtu.py)
+calls the hooks itself.
+"""
+
+import functools
+import http.server
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+NUM_FC = 128
+SUB_BUCKETS = 8
+NUM_BUCKETS = 200
+
+FC_NAMES = {
+    1: "read_coils",
+    2: "read_discrete_inputs",
+    3: "read_holding_registers",
+    4: "read_input_registers",
+    5: "write_single_coil",
+    6: "write_single_register",
+    15: "write_multiple_coils",
+    16: "write_multiple_registers",
+    23: "read_write_multiple_registers",
+}
+
+
+def bucket(us):
+    """Histogram bucket of a latency in whole microseconds."""
+    if us < 2 * SUB_BUCKETS:
+        return us
+    shift = us.bit_length() - 4
+    return min(shift * SUB_BUCKETS + (us >> shift), NUM_BUCKETS - 1)
+
+
+def bucket_upper_us(index):
+    """Exclusive upper bound of a bucket, in microseconds."""
+    if index < 2 * SUB_BUCKETS:
+        return index + 1
+    shift = index // SUB_BUCKETS - 1
+    return (index - shift * SUB_BUCKETS + 1) << shift
+
+
+class MetricsStore:
+    """Preallocated metric arrays for `rows` recording processes."""
+
+    LAYOUT = (
+        ("requests", (NUM_FC,)),
+        ("exceptions", (NUM_FC,)),
+        ("bytes_in", (NUM_FC,)),
+        ("bytes_out", (NUM_FC,)),
+        ("latency_sum_ns", (NUM_FC,)),
+        ("latency", (NUM_FC, NUM_BUCKETS)),
+        ("ticks", (1,)),
+        ("tick_sum_ns", (1,)),
+        ("tick_max_ns", (1,)),
+        ("tick_duration", (NUM_BUCKETS,)),
+        ("jitter_sum_ns", (1,)),
+        ("jitter_max_ns", (1,)),
+        ("tick_jitter", (NUM_BUCKETS,)),
+    )
+
+    def __init__(self, rows=1, shared=False):
+        self.rows = rows
+        size = sum(rows * int(np.prod(shape)) * 8 for _, shape in self.LAYOUT)
+        self.shm = shared_memory.SharedMemory(create=True, size=size) if shared else None
+        buffer = self.shm.buf if shared else bytearray(size)
+        offset = 0
+        for name, shape in self.LAYOUT:
+            array = np.ndarray((rows, *shape), dtype=np.int64, buffer=buffer, offset=offset)
+            array.fill(0)
+            setattr(self, name, array)
+            offset += array.nbytes
+
+    def recorder(self, row=0):
+        return Recorder(self, row)
+
+    def unlink(self):
+        if self.shm is not None:
+            self.shm.unlink()
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        total = {name: getattr(self, name).sum(axis=0) for name, _ in self.LAYOUT}
+        for name in ("tick_max_ns", "jitter_max_ns"):
+            total[name] = getattr(self, name).max(axis=0)
+        lines = []
+        active = np.flatnonzero(total["requests"])
+
+        def fc_labels(fc):
+            return f'fc="{fc}",name="{FC_NAMES.get(fc, "other")}"'
+
+        for metric, key, help_text in (
+            ("modbus_requests_total", "requests", "Requests handled"),
+            ("modbus_exceptions_total", "exceptions", "Exception responses sent"),
+            ("modbus_request_bytes_total", "bytes_in", "Request bytes received"),
+            ("modbus_response_bytes_total", "bytes_out", "Response bytes sent"),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f"{metric}{{{fc_labels(fc)}}} {total[key][fc]}" for fc in active]
+
+        metric = "modbus_request_latency_seconds"
+        lines += [f"# HELP {metric} Request handling time, decoded to encoded",
+                  f"# TYPE {metric} histogram"]
+        for fc in active:
+            lines += _histogram(metric, fc_labels(fc), total["latency"][fc],
+                                total["latency_sum_ns"][fc], total["requests"][fc])
+
+        ticks = total["ticks"][0]
+        for metric, key, sum_key, max_key, help_text in (
+            ("slave_tick_duration_seconds", "tick_duration", "tick_sum_ns", "tick_max_ns",
+             "Physics step duration"),
+            ("slave_tick_jitter_seconds", "tick_jitter", "jitter_sum_ns", "jitter_max_ns",
+             "Tick start minus its deadline"),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            lines += _histogram(metric, "", total[key], total[sum_key][0], ticks)
+            lines += [f"# HELP {metric}_max Worst {help_text.lower()}",
+                      f"# TYPE {metric}_max gauge",
+                      f"{metric}_max {total[max_key][0] / 1e9:.9f}"]
+        return "\n".join(lines) + "\n"
+
+
+def _histogram(metric, labels, counts, sum_ns, count):
+    sep = "," if labels else ""
+    lines = []
+    cumulative = 0
+    for index in range(np.flatnonzero(counts)[-1] + 1 if counts.any() else 0):
+        cumulative += counts[index]
+        le = bucket_upper_us(index) / 1e6
+        lines.append(f'{metric}_bucket{{{labels}{sep}le="{le:.6g}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels}{sep}le="+Inf"}} {count}')
+    lines.append(f"{metric}_sum{{{labels}}} {sum_ns / 1e9:.9f}" if labels else f"{metric}_sum {sum_ns / 1e9:.9f}")
+    lines.append(f"{metric}_count{{{labels}}} {count}" if labels else f"{metric}_count {count}")
+    return lines
+
+
+class Recorder:
+    """Records into one row of a MetricsStore; not shared between threads
+    that record the same kind of metric."""
+
+    def __init__(self, store, row):
+        self.requests = store.requests[row]
+        self.exceptions = store.exceptions[row]
+        self.bytes_in = store.bytes_in[row]
+        self.bytes_out = store.bytes_out[row]
+        self.latency_sum_ns = store.latency_sum_ns[row]
+        self.latency = store.latency[row]
+        self.ticks = store.ticks[row]
+        self.tick_sum_ns = store.tick_sum_ns[row]
+        self.tick_max_ns = store.tick_max_ns[row]
+        self.tick_duration = store.tick_duration[row]
+        self.jitter_sum_ns = store.jitter_sum_ns[row]
+        self.jitter_max_ns = store.jitter_max_ns[row]
+        self.tick_jitter = store.tick_jitter[row]
+
+    def trace_packet(self, sending, data):
+        """pymodbus trace_packet hook: count MBAP frame bytes per FC."""
+        if len(data) >= 8:
+            size = 6 + (data[4] << 8 | data[5])
+            if sending:
+                self.observe_bytes(True, data[7], len(data))
+            elif len(data) >= size:
+                # The server re-feeds its buffer until every frame is used,
+                # and each call consumes only the first one.
+                self.observe_bytes(False, data[7], size)
+        return data
+
+    def observe_bytes(self, sending, fc, size):
+        """Count one request (or response, if sending) frame of size bytes."""
+        if sending:
+            self.bytes_out[fc & 0x7F] += size
+        else:
+            self.bytes_in[fc & 0x7F] += size
+
+    def trace_pdu(self, sending, pdu):
+        """pymodbus trace_pdu hook: time requests from decode to response."""
+        now = time.perf_counter_ns()
+        if not sending:
+            pdu.update_datastore = functools.partial(
+                _traced, pdu.update_datastore, pdu.function_code & 0x7F, now
+            )
+            return pdu
+        traced = getattr(pdu, "traced", None)
+        if traced is None:
+            fc = pdu.function_code & 0x7F
+            self.requests[fc] += 1
+            self.exceptions[fc] += pdu.function_code >= 0x80
+            return pdu
+        fc, start = traced
+        elapsed = now - start
+        self.requests[fc] += 1
+        self.exceptions[fc] += pdu.function_code >= 0x80
+        self.latency_sum_ns[fc] += elapsed
+        self.latency[fc, bucket(elapsed // 1000)] += 1
+        return pdu
+
+    def observe_tick(self, duration_ns, jitter_ns):
+        """Record one physics step; jitter_ns is None without a deadline."""
+        self.ticks[0] += 1
+        self.tick_sum_ns[0] += duration_ns
+        if duration_ns > self.tick_max_ns[0]:
+            self.tick_max_ns[0] = duration_ns
+        self.tick_duration[bucket(duration_ns // 1000)] += 1
+        if jitter_ns is None:
+            return
+        jitter_ns = max(jitter_ns, 0)
+        self.jitter_sum_ns[0] += jitter_ns
+        if jitter_ns > self.jitter_max_ns[0]:
+            self.jitter_max_ns[0] = jitter_ns
+        self.tick_jitter[bucket(jitter_ns // 1000)] += 1
+
+    def server_kwargs(self):
+        """Trace hooks to pass to a pymodbus server."""
+        return {"trace_packet": self.trace_packet, "trace_pdu": self.trace_pdu}
+
+
+async def _traced(update_datastore, fc, start, context):
+    """A request's update_datastore, tagging the response with its timing."""
+    response = await update_datastore(context)
+    response.traced = (fc, start)
+    return response
+
+
+class MetricsExporter:
+    """Serves MetricsStore.render() at /metrics from a daemon thread."""
+
+    def __init__(self, store, port, host="127.0.0.1"):
+        self.store = store
+        self.address = (host, port)
+        self.sources = []
+
+    def render(self):
+        text = self.store.render()
+        for source in self.sources:
+            text += "\n".join(source.render()) + "\n"
+        return text
+
+    def start(self):
+        exporter = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(self.address, Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
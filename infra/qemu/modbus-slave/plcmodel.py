@@ -0,0 +1,354 @@
+"""Plant model compiled from a RustPLC .plc file.
+
+Only the declarative parts the simulator needs are read; the full grammar
+lives in crates/rustplc_compiler/src/parser/plc.pest. The [topology]
+section is parsed once at load time into Device records and then compiled
+into flat NumPy tables (see bind_cylinders), so the tick never touches
+names, strings or dictionaries.
+
+Cylinder semantics follow the generated runtime code: `extend cyl_A`
+writes coil "cyl_A" true and `retract cyl_A` writes it false, i.e. each
+.plc cylinder is driven by one monostable valve. A cylinder's coil is
+looked up in the HAL map under the cylinder name, then along its
+connected_to chain (valve name, then digital output name).
+
+Motors follow `set motor on/off`: coil "motor" on turns the motor at its
+rated_speed, reached over ramp_time. Sensors that detect
+`motor.position_<P>` become its position sensors (see bind_motors).
+
+`safety:` rules of the [constraints] section are compiled against the
+same bindings into index pairs for the runtime monitor (see bind_safety
+and safety.py), and the step timeouts of the [tasks] section and its
+`timing:` rules into stroke limits for the timing monitor (see
+bind_timing and timing.py).
+"""
+
+import math
+import re
+
+import numpy as np
+
+from halmap import DEFAULT_RPM, CylinderBinding, MotorBinding
+from safety import (
+    SOURCE_COIL, SOURCE_EXTENDED, SOURCE_MOTOR_ON, SOURCE_POSITION, SOURCE_RETRACTED, SafetyBinding,
+)
+from timing import STROKE_EXTEND, STROKE_POSITION, STROKE_RETRACT, TimingBinding
+
+_SECTION = re.compile(r"^\s*\[(\w+)\]\s*$", re.MULTILINE)
+_COMMENT = re.compile(r'("(?:[^"\\]|\\.)*")|#[^\n]*')
+_DEVICE = re.compile(r"device\s+(\w+)\s*:\s*(\w+)\s*(?:\{([^}]*)\})?")
+_ATTRIBUTE = re.compile(r'(\w+)\s*:\s*("(?:[^"\\]|\\.)*"|[\w.]+)')
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)(ms|s)$")
+_SPEED = re.compile(r"^(\d+(?:\.\d+)?)rpm$")
+_SAFETY = re.compile(r"safety\s*:\s*(\w+)\.(\w+)\s+(conflicts_with|requires)\s+(\w+)\.(\w+)")
+_TIMING = re.compile(
+    r"timing\s*:\s*task\.(\w+)(?:\.(\w+))?\s+(must_complete_within|must_start_after)\s+([\w.]+)"
+)
+_TASK = re.compile(r"^\s*task\s+(\w+)\s*:", re.MULTILINE)
+_STEP = re.compile(r"^\s*step\s+(\w+)\s*:", re.MULTILINE)
+_WAIT = re.compile(r"wait\s*:\s*(\w+)(?:\.(\w+))?\s*==\s*true\b")
+_TIMEOUT = re.compile(r"timeout\s*:\s*([\w.]+)\s*->")
+
+
+class Device:
+    """One `device NAME: KIND { attr: value, ... }` declaration."""
+
+    def __init__(self, name, kind, attrs):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+
+    def duration_ms(self, attr, default=0.0):
+        """Return a duration attribute in milliseconds."""
+        value = self.attrs.get(attr)
+        return default if value is None else parse_duration_ms(value)
+
+    def speed_rpm(self, attr, default=0.0):
+        """Return a speed attribute in revolutions per minute."""
+        value = self.attrs.get(attr)
+        return default if value is None else parse_speed_rpm(value)
+
+    def __repr__(self):
+        return f"Device({self.name}: {self.kind} {self.attrs})"
+
+
+def parse_duration_ms(value):
+    """Parse a .plc duration literal ("300ms", "2s") into milliseconds."""
+    match = _DURATION.match(value)
+    if not match:
+        raise ValueError(f"not a duration: {value!r}")
+    number, unit = match.groups()
+    return float(number) * (1000.0 if unit == "s" else 1.0)
+
+
+def parse_speed_rpm(value):
+    """Parse a .plc speed literal ("60rpm") into revolutions per minute."""
+    match = _SPEED.match(value)
+    if not match:
+        raise ValueError(f"not a speed: {value!r}")
+    return float(match.group(1))
+
+
+def split_sections(text):
+    """Return {section name: body} with comments removed."""
+    text = _COMMENT.sub(lambda m: m.group(1) or "", text)
+    sections = {}
+    matches = list(_SECTION.finditer(text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections[match.group(1)] = text[match.end() : end]
+    return sections
+
+
+class PlcModel:
+    """Devices declared in the [topology] section of a .plc file, plus the
+    safety rules of its [constraints] section as (device, state, relation,
+    device, state) tuples, its timing rules as (task, step or "",
+    relation, duration) tuples and the steps of its [tasks] section as
+    {task: [(step, waits, timeout_ms or None)]}, waits being the
+    (operand, state or "") of each `wait: ... == true`."""
+
+    def __init__(self, devices, source="<plc>", safety=(), timing=(), tasks=None):
+        self.source = source
+        self.devices = {device.name: device for device in devices}
+        self.safety = list(safety)
+        self.timing = list(timing)
+        self.tasks = tasks if tasks is not None else {}
+
+    @classmethod
+    def parse(cls, text, source="<plc>"):
+        sections = split_sections(text)
+        devices = []
+        for name, kind, body in _DEVICE.findall(sections.get("topology", "")):
+            attrs = {key: value.strip('"') for key, value in _ATTRIBUTE.findall(body)}
+            devices.append(Device(name, kind, attrs))
+        safety = _SAFETY.findall(sections.get("constraints", ""))
+        timing = _TIMING.findall(sections.get("constraints", ""))
+        return cls(devices, source, safety, timing, parse_tasks(sections.get("tasks", "")))
+
+    def of_kind(self, kind):
+        return [device for device in self.devices.values() if device.kind == kind]
+
+    def chain(self, name):
+        """Yield a device and everything it is connected_to, nearest first."""
+        seen = set()
+        while name in self.devices and name not in seen:
+            seen.add(name)
+            yield self.devices[name]
+            name = self.devices[name].attrs.get("connected_to")
+        if name is not None and name not in seen:
+            yield Device(name, "digital_output", {})
+
+    def bind_cylinders(self, hal_map):
+        """Compile every cylinder into a CylinderBinding against hal_map.
+
+        Timing per cylinder, in ms:
+          extend  = valve response_time + stroke_time  + end sensor debounce
+          retract = valve response_time + retract_time + home sensor debounce
+        retract_time defaults to stroke_time; a cylinder without stroke_time
+        falls back to the simulator's default threshold. The response time
+        and debounces are also kept apart for the exact timing model.
+        """
+        sensors = {}
+        for sensor in self.of_kind("sensor"):
+            target, _, state = sensor.attrs.get("detects", "").partition(".")
+            sensors.setdefault((target, state), sensor)
+
+        names, extend_coil, home_di, end_di = [], [], [], []
+        home_invert, end_invert, extend_ms, retract_ms = [], [], [], []
+        response, home_debounce, end_debounce = [], [], []
+        for cyl in self.of_kind("cylinder"):
+            response_ms = sum(d.duration_ms("response_time") for d in self.chain(cyl.name))
+            stroke_ms = cyl.duration_ms("stroke_time", math.nan)
+            home = sensors.get((cyl.name, "retracted"))
+            end = sensors.get((cyl.name, "extended"))
+
+            names.append(cyl.name)
+            extend_coil.append(_lookup(hal_map.coils, self.chain(cyl.name)))
+            home_di.append(_lookup(hal_map.discrete_inputs, self.chain(home.name)) if home else -1)
+            end_di.append(_lookup(hal_map.discrete_inputs, self.chain(end.name)) if end else -1)
+            home_invert.append(home is not None and home.attrs.get("inverted") == "true")
+            end_invert.append(end is not None and end.attrs.get("inverted") == "true")
+            response.append(response_ms)
+            home_debounce.append(home.duration_ms("debounce") if home else 0.0)
+            end_debounce.append(end.duration_ms("debounce") if end else 0.0)
+            extend_ms.append(response_ms + stroke_ms + end_debounce[-1])
+            retract_ms.append(response_ms + cyl.duration_ms("retract_time", stroke_ms) + home_debounce[-1])
+
+        return CylinderBinding(
+            names,
+            extend_coil=extend_coil,
+            retract_coil=extend_coil,
+            home_di=home_di,
+            end_di=end_di,
+            retract_invert=np.ones(len(names), dtype=bool),
+            home_invert=home_invert,
+            end_invert=end_invert,
+            extend_ms=extend_ms,
+            retract_ms=retract_ms,
+            response_ms=response,
+            home_debounce_ms=home_debounce,
+            end_debounce_ms=end_debounce,
+        )
+
+    def bind_motors(self, hal_map):
+        """Compile every motor and its position sensors into a MotorBinding.
+
+        A motor's position sensors are laid out evenly around the turn in
+        the order of their position names (position_A at 0, position_B at
+        half a turn, ...); rated_speed defaults to DEFAULT_RPM and
+        ramp_time to an instant start.
+        """
+        positions = {}
+        for sensor in self.of_kind("sensor"):
+            target, _, state = sensor.attrs.get("detects", "").partition(".")
+            if state.startswith("position_"):
+                positions.setdefault(target, {}).setdefault(state, sensor)
+
+        names, coil, rated, ramp = [], [], [], []
+        sensor_names, sensor_di, sensor_motor, sensor_slot, sensor_invert = [], [], [], [], []
+        for motor in self.of_kind("motor"):
+            for slot, (state, sensor) in enumerate(sorted(positions.get(motor.name, {}).items())):
+                sensor_names.append(f"{motor.name}.{state}")
+                sensor_di.append(_lookup(hal_map.discrete_inputs, self.chain(sensor.name)))
+                sensor_motor.append(len(names))
+                sensor_slot.append(slot)
+                sensor_invert.append(sensor.attrs.get("inverted") == "true")
+            names.append(motor.name)
+            coil.append(_lookup(hal_map.coils, self.chain(motor.name)))
+            rated.append(motor.speed_rpm("rated_speed", DEFAULT_RPM))
+            ramp.append(motor.duration_ms("ramp_time"))
+
+        return MotorBinding(
+            names,
+            coil,
+            rated_rpm=rated,
+            ramp_ms=ramp,
+            sensor_names=sensor_names,
+            sensor_di=sensor_di,
+            sensor_motor=sensor_motor,
+            sensor_slot=sensor_slot,
+            sensor_invert=sensor_invert,
+        )
+
+    def bind_safety(self, hal_map, cylinders, motors):
+        """Compile the safety rules against this station's bindings.
+
+        States: cylinder extended/retracted, motor on/off and position_<P>,
+        and on/off of anything that resolves to a coil (valves, digital
+        outputs). `off` and `requires` negate their side.
+        """
+        cylinder_index = {name: i for i, name in enumerate(cylinders.names)}
+        motor_index = {name: i for i, name in enumerate(motors.names)}
+        sensor_index = {name: i for i, name in enumerate(motors.sensor_names)}
+
+        def resolve(device, state):
+            if device in cylinder_index and state in ("extended", "retracted"):
+                source = SOURCE_EXTENDED if state == "extended" else SOURCE_RETRACTED
+                return source, cylinder_index[device], False
+            if device in motor_index and state in ("on", "off"):
+                return SOURCE_MOTOR_ON, motor_index[device], state == "off"
+            if f"{device}.{state}" in sensor_index:
+                return SOURCE_POSITION, sensor_index[f"{device}.{state}"], False
+            if state in ("on", "off"):
+                addr = _lookup(hal_map.coils, self.chain(device))
+                if addr >= 0:
+                    return SOURCE_COIL, addr, state == "off"
+            raise ValueError(f"{self.source}: safety: cannot monitor {device}.{state}")
+
+        names, left, right = [], [], []
+        for left_device, left_state, relation, right_device, right_state in self.safety:
+            names.append(f"{left_device}.{left_state} {relation} {right_device}.{right_state}")
+            left.append(resolve(left_device, left_state))
+            source, index, negate = resolve(right_device, right_state)
+            right.append((source, index, negate ^ (relation == "requires")))
+        left_source, left_index, left_negate = zip(*left) if left else ((), (), ())
+        right_source, right_index, right_negate = zip(*right) if right else ((), (), ())
+        return SafetyBinding(names, left_source, left_index, left_negate,
+                             right_source, right_index, right_negate)
+
+    def bind_timing(self, cylinders, motors):
+        """Compile the step timeouts and timing rules against this
+        station's bindings.
+
+        A step's timeout limits every stroke its waits resolve to: a sensor
+        (or device.state reference) for a cylinder's extended / retracted
+        state or a motor's position_<P>. Other waits (buttons, inputs) are
+        not plant strokes and are skipped. must_start_after rules are not
+        monitored (see timing.py).
+        """
+        cylinder_index = {name: i for i, name in enumerate(cylinders.names)}
+        sensor_index = {name: i for i, name in enumerate(motors.sensor_names)}
+
+        def resolve(operand, state):
+            if not state:
+                device = self.devices.get(operand)
+                if device is None or device.kind != "sensor":
+                    return None
+                operand, _, state = device.attrs.get("detects", "").partition(".")
+            if operand in cylinder_index and state in ("extended", "retracted"):
+                source = STROKE_EXTEND if state == "extended" else STROKE_RETRACT
+                return source, cylinder_index[operand]
+            if f"{operand}.{state}" in sensor_index:
+                return STROKE_POSITION, sensor_index[f"{operand}.{state}"]
+            return None
+
+        limits, steps = [], {}
+        for task, task_steps in self.tasks.items():
+            for step, waits, timeout_ms in task_steps:
+                strokes = [stroke for stroke in (resolve(*wait) for wait in waits) if stroke]
+                steps[task, step] = strokes
+                if timeout_ms is not None:
+                    limits += [(*stroke, round(timeout_ms * 1_000_000)) for stroke in strokes]
+
+        task_names, task_limit, step_task, terms = [], [], [], []
+        for task, step, relation, duration in self.timing:
+            if relation != "must_complete_within" or task not in self.tasks:
+                continue
+            scope = [name for name, _, _ in self.tasks[task] if not step or name == step]
+            task_names.append(f"task.{task}.{step}" if step else f"task.{task}")
+            task_limit.append(round(parse_duration_ms(duration) * 1_000_000))
+            for name in scope:
+                terms += [(len(step_task), *stroke) for stroke in steps[task, name]]
+                step_task.append(len(task_names) - 1)
+
+        limit_source, limit_index, limit_ns = zip(*limits) if limits else ((), (), ())
+        term_step, term_source, term_index = zip(*terms) if terms else ((), (), ())
+        return TimingBinding(limit_source, limit_index, limit_ns, task_names, task_limit,
+                             step_task, term_step, term_source, term_index)
+
+
+def parse_tasks(text):
+    """Steps of a [tasks] section body: {task: [(step, waits, timeout_ms or None)]}.
+
+    Waits and timeouts anywhere in a step count for the step, race
+    branches included; with several timeouts the shortest applies.
+    """
+    tasks = {}
+    matches = list(_TASK.finditer(text))
+    for i, task in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[task.end() : end]
+        steps = []
+        step_matches = list(_STEP.finditer(body))
+        for j, step in enumerate(step_matches):
+            step_end = step_matches[j + 1].start() if j + 1 < len(step_matches) else len(body)
+            step_body = body[step.end() : step_end]
+            timeouts = [parse_duration_ms(value) for value in _TIMEOUT.findall(step_body)]
+            steps.append((step.group(1), _WAIT.findall(step_body), min(timeouts) if timeouts else None))
+        tasks[task.group(1)] = steps
+    return tasks
+
+
+def _lookup(table, chain):
+    """Address of the first device in chain that the HAL table maps, or -1."""
+    for device in chain:
+        if device.name in table:
+            return table[device.name]
+    return -1
+
+
+def load_plc(path):
+    """Parse a .plc file into a PlcModel."""
+    with open(path, encoding="utf-8") as f:
+        return PlcModel.parse(f.read(), source=str(path))
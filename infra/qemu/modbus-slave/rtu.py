@@ -0,0 +1,191 @@
+"""Modbus RTU over a pseudo-terminal with a serial line timing model.
+
+`--rtu-pty PATH` opens a Linux pty pair, puts it in raw mode and links
+PATH to the slave end, so the RustPLC runtime can use a hal_*_rtu.toml
+with `serial_port = PATH` on a plain Linux box, with no adapter attached.
+
+A pty moves bytes instantly, so the wire is modelled instead:
+  - a character takes bits_per_char / baud seconds (11 bits: start, 8
+    data, parity or second stop, stop), for requests and responses;
+  - a frame ends after a t3.5 silence: 3.5 characters, fixed at 1.75 ms
+    above 19200 baud as the Modbus serial line spec requires;
+  - the line is half duplex: a request that arrives while the previous
+    response is still "on the wire" waits for it plus t3.5.
+The request is handled at the modelled end of its t3.5 gap and the
+response is written to the pty when its last character would have left
+the wire. The master therefore sees serial timing end to end, and the
+per-poll budget can be checked against cycle_time_ms.
+
+Served on the same datastore as the TCP server: unit IDs the context does
+not serve get no answer, as on a multidrop bus, and unit ID 0 is a
+broadcast that is executed but not answered.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import tty
+
+from pymodbus.constants import ExcCodes
+from pymodbus.exceptions import NoSuchIdException
+from pymodbus.framer import FramerRTU
+from pymodbus.pdu import DecodePDU, ExceptionResponse
+
+from fastread import READ_REQUESTS
+
+log = logging.getLogger("modbus_slave.rtu")
+
+BITS_PER_CHAR = 11
+# Modbus over serial line V1.02, 2.5.1.1: fixed t3.5 above 19200 baud.
+FIXED_GAP_BAUD = 19200
+FIXED_GAP_S = 0.00175
+REPORT_S = 10.0
+
+
+class SerialLine:
+    """Timing model of one half-duplex RS-485 line."""
+
+    def __init__(self, baud, bits_per_char=BITS_PER_CHAR):
+        self.baud = baud
+        self.char_s = bits_per_char / baud
+        self.gap_s = FIXED_GAP_S if baud > FIXED_GAP_BAUD else 3.5 * self.char_s
+        self.free_at = 0.0
+
+    def frame_s(self, size):
+        return size * self.char_s
+
+
+class PtyLink:
+    """Raw pty pair; `path` is a symlink to the slave end."""
+
+    def __init__(self, path):
+        self.master_fd, self.slave_fd = os.openpty()
+        # Raw mode: no echo, no line discipline, all 8 bits pass through.
+        tty.setraw(self.slave_fd)
+        self.tty_name = os.ttyname(self.slave_fd)
+        self.path = path
+        if os.path.lexists(path):
+            os.unlink(path)
+        os.symlink(self.tty_name, path)
+
+    def close(self):
+        if os.path.islink(self.path):
+            os.unlink(self.path)
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+
+class RtuServer:
+    """Serves a ModbusServerContext on a PtyLink, paced by a SerialLine.
+
+    Runs in the calling thread; handle() drives each request's datastore
+    update on a private event loop (a CHECKPOINT write waits there for the
+    physics thread).
+    """
+
+    def __init__(self, context, link, line, recorder=None):
+        self.context = context
+        self.link = link
+        self.line = line
+        self.recorder = recorder
+        decoder = DecodePDU(True)
+        for request in READ_REQUESTS:
+            decoder.register(request)
+        self.framer = FramerRTU(decoder)
+        self.loop = asyncio.new_event_loop()
+        self.buffer = b""
+        # Totals for the periodic line report, in seconds.
+        self.requests = 0
+        self.busy_s = 0.0
+        self.poll_s = 0.0
+        self.poll_max_s = 0.0
+
+    def serve_forever(self):
+        log.info(
+            "Serving Modbus RTU on %s (%s), %d baud: char %.1fus, t3.5 %.3fms",
+            self.link.path, self.link.tty_name, self.line.baud,
+            self.line.char_s * 1e6, self.line.gap_s * 1e3,
+        )
+        next_report = time.monotonic() + REPORT_S
+        while True:
+            data = os.read(self.link.master_fd, 4096)
+            received = time.monotonic()
+            self.buffer += data
+            while self.buffer:
+                used, pdu = self.framer.handleFrame(self.buffer, 0, 0)
+                if not used:
+                    break
+                self.handle(pdu, used, received)
+                self.buffer = self.buffer[used:]
+            if received >= next_report:
+                self.report()
+                next_report = received + REPORT_S
+
+    def handle(self, pdu, size, received):
+        """Answer one decoded request frame of `size` bytes on the modelled line."""
+        line = self.line
+        if pdu is None:
+            # Bad CRC or unknown function: a real slave stays silent.
+            return
+        # The master started sending when the bytes showed up, or once the
+        # line was free if our last response was still being transmitted.
+        start = max(received, line.free_at)
+        handle_at = start + line.frame_s(size) + line.gap_s
+        _sleep_until(handle_at)
+
+        if self.recorder is not None:
+            self.recorder.trace_pdu(False, pdu)
+            self.recorder.observe_bytes(False, pdu.function_code, size)
+        response = self.execute(pdu)
+        if response is None:
+            line.free_at = time.monotonic() + line.gap_s
+            return
+        response.dev_id = pdu.dev_id
+        if self.recorder is not None:
+            self.recorder.trace_pdu(True, response)
+        frame = self.framer.buildFrame(response)
+
+        # Transmission starts once the request is handled and ends
+        # frame_s later; deliver the frame at its last character.
+        sent_at = time.monotonic() + line.frame_s(len(frame))
+        _sleep_until(sent_at)
+        os.write(self.link.master_fd, frame)
+        line.free_at = sent_at + line.gap_s
+        if self.recorder is not None:
+            self.recorder.observe_bytes(True, response.function_code, len(frame))
+
+        self.requests += 1
+        poll = sent_at - start
+        self.poll_s += poll
+        self.poll_max_s = max(self.poll_max_s, poll)
+        self.busy_s += line.frame_s(size + len(frame))
+
+    def execute(self, pdu):
+        """Run the request against the datastore; None means no reply."""
+        try:
+            if pdu.dev_id == 0:
+                for dev_id in self.context.device_ids():
+                    self.loop.run_until_complete(pdu.update_datastore(self.context[dev_id]))
+                return None
+            return self.loop.run_until_complete(pdu.update_datastore(self.context[pdu.dev_id]))
+        except NoSuchIdException:
+            return None
+        except Exception:  # the TCP server answers these the same way
+            log.exception("Datastore unable to fulfill request")
+            return ExceptionResponse(pdu.function_code, ExcCodes.DEVICE_FAILURE)
+
+    def report(self):
+        if not self.requests:
+            return
+        log.info(
+            "RTU: %d polls, mean %.2fms, max %.2fms (frames on the wire %.2fms/poll)",
+            self.requests, self.poll_s / self.requests * 1e3, self.poll_max_s * 1e3,
+            self.busy_s / self.requests * 1e3,
+        )
+
+
+def _sleep_until(deadline):
+    delay = deadline - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
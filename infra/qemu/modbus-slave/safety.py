@@ -0,0 +1,148 @@
+"""Runtime monitor for the [constraints] safety rules of a .plc file.
+
+The static verifiers prove that the generated program never drives the
+plant into a forbidden state; this module checks the simulated plant
+itself against the same rules, continuously, while Mode B runs.
+
+  safety: A.x conflicts_with B.y   violated while A.x and B.y both hold
+  safety: A.x requires B.y         violated while A.x holds and B.y does not
+
+Each rule is compiled at load time into a pair of indices into one flat
+boolean state vector, plus a negation flag per side (`off` states and the
+`requires` relation are negations), so evaluating every rule is one gather,
+one XOR and one AND over the whole table:
+
+  violated = (state[left] ^ left_negate) & (state[right] ^ right_negate)
+
+State sources, laid end to end in the state vector (SOURCES order):
+  - extended / retracted: the cylinder's end / home position is reached
+  - motor_on:             the motor is switched on or still turning
+  - position:             a motor position sensor's window is reached
+  - coil:                 the coil image (valves and digital outputs on)
+Cylinder and motor states are the physical plant, before any sensor
+inversion.
+"""
+
+import numpy as np
+
+SOURCE_EXTENDED = 0
+SOURCE_RETRACTED = 1
+SOURCE_MOTOR_ON = 2
+SOURCE_POSITION = 3
+SOURCE_COIL = 4
+SOURCES = ("extended", "retracted", "motor_on", "position", "coil")
+
+RELATIONS = ("conflicts_with", "requires")
+
+
+class SafetyBinding:
+    """Flat per-rule table: (source, index, negate) of both sides.
+
+    Indices are local to the source (cylinder, motor, position sensor or
+    coil address of one unit) until concat moves them into joint images.
+    """
+
+    def __init__(self, names, left_source=(), left_index=(), left_negate=(),
+                 right_source=(), right_index=(), right_negate=()):
+        self.names = list(names)
+        self.count = len(self.names)
+        self.left_source = np.array(left_source, dtype=np.intp)
+        self.left_index = np.array(left_index, dtype=np.intp)
+        self.left_negate = np.array(left_negate, dtype=bool)
+        self.right_source = np.array(right_source, dtype=np.intp)
+        self.right_index = np.array(right_index, dtype=np.intp)
+        self.right_negate = np.array(right_negate, dtype=bool)
+
+    @classmethod
+    def concat(cls, parts):
+        """Join per-unit bindings into one binding over the joint sources.
+
+        :param parts: (binding, name_prefix, offsets) tuples; offsets gives
+            the unit's first index in each source, in SOURCES order
+        """
+        names, left, right = [], [], []
+        for binding, prefix, offsets in parts:
+            offsets = np.asarray(offsets, dtype=np.intp)
+            names += [prefix + name for name in binding.names]
+            left.append(binding.left_index + offsets[binding.left_source])
+            right.append(binding.right_index + offsets[binding.right_source])
+        bindings = [part[0] for part in parts]
+        return cls(
+            names,
+            np.concatenate([b.left_source for b in bindings]),
+            np.concatenate(left),
+            np.concatenate([b.left_negate for b in bindings]),
+            np.concatenate([b.right_source for b in bindings]),
+            np.concatenate(right),
+            np.concatenate([b.right_negate for b in bindings]),
+        )
+
+
+class SafetyMonitor:
+    """Evaluates every rule of a SafetyBinding against the plant state.
+
+    Per rule it keeps whether it is violated right now, how many times it
+    became violated, and the plant time (ns) of the first and the latest
+    onset (-1: never).
+    """
+
+    # State saved by checkpoint.Checkpoint.
+    STATE_ARRAYS = ("active", "violations", "first_ns", "last_ns")
+    STATE_VALUES = ("total",)
+
+    def __init__(self, binding, sizes):
+        """:param sizes: length of each source, in SOURCES order"""
+        self.binding = binding
+        self.count = binding.count
+        base = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+        self.left = base[binding.left_source] + binding.left_index
+        self.right = base[binding.right_source] + binding.right_index
+        self.left_negate = binding.left_negate
+        self.right_negate = binding.right_negate
+
+        self.active = np.zeros(self.count, dtype=bool)
+        self.violations = np.zeros(self.count, dtype=np.int64)
+        self.first_ns = np.full(self.count, -1, dtype=np.int64)
+        self.last_ns = np.full(self.count, -1, dtype=np.int64)
+        self.total = 0
+
+    def check(self, plant_ns, *states):
+        """Evaluate every rule against the current state.
+
+        :param states: bool arrays of each source, in SOURCES order
+        :returns: (indices of rules that became violated, indices of rules
+                  that cleared), both usually empty
+        """
+        state = np.concatenate(states)
+        violated = (state[self.left] ^ self.left_negate) & (state[self.right] ^ self.right_negate)
+        changed = np.flatnonzero(violated != self.active)
+        if not changed.size:
+            return changed, changed
+        onset = changed[violated[changed]]
+        cleared = changed[~violated[changed]]
+        self.active = violated
+        if onset.size:
+            self.violations[onset] += 1
+            self.first_ns[onset] = np.where(self.first_ns[onset] < 0, plant_ns, self.first_ns[onset])
+            self.last_ns[onset] = plant_ns
+            self.total += onset.size
+        return onset, cleared
+
+    def render(self):
+        """Prometheus text lines for the metrics endpoint."""
+        names = self.binding.names
+        lines = []
+        for metric, kind, help_text, values, scale in (
+            ("slave_safety_violations_total", "counter", "Times a safety rule became violated",
+             self.violations, None),
+            ("slave_safety_violated", "gauge", "Safety rule violated now (1) or not (0)",
+             self.active.astype(np.int64), None),
+            ("slave_safety_last_violation_seconds", "gauge",
+             "Plant time of the latest violation onset (-1: never)", self.last_ns, 1e9),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            for name, value in zip(names, values.tolist()):
+                if scale is not None and value >= 0:
+                    value = f"{value / scale:.9f}"
+                lines.append(f'{metric}{{constraint="{name}"}} {value}')
+        return lines
@@ -0,0 +1,219 @@
+"""Shared-memory I/O image for the multi-process server (--workers).
+
+One multiprocessing.shared_memory segment holds every table of every unit,
+so N forked server processes and the single physics process all work on
+the same plant image. Layout (native uint64, big-endian uint16 registers,
+8-byte aligned):
+
+  header     uint64 tick_count, uint64 overruns, uint64 violations,
+             uint64 late_strokes
+  per unit:  uint64 DI generation, uint64 IR generation
+             coils  packed bits                MAX_BITS/8 bytes
+             DI     2 x packed bits
+             HR     uint16 x MAX_REGS
+             IR     2 x uint16 x MAX_REGS
+
+Tables written by masters (coils, HR) are single images updated in place
+under one process-shared lock, so two workers doing a read-modify-write
+on the same byte cannot lose a bit. Tables written by the physics process
+(DI, IR) keep the double buffer of datablock.py, but the front buffer is
+selected by a generation counter in the segment rather than by a Python
+reference: the writer fills the back buffer, then bumps the counter.
+
+The writer flips under the shared lock, and a reader takes the counter
+under the lock before and after reading the buffer it selected. Only the
+second flip after that writes the buffer being read, so the reader
+retries if the counter moved by two or more, and never returns a mix of
+two ticks. Every ordering this relies on comes from the lock's acquire
+and release; unlike a lock-free seqlock it needs no memory barriers on
+weakly ordered CPUs (the arm64 target).
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from datablock import MAX_BITS, MAX_REGS, REG_DTYPE, PackedBitDataBlock, RegisterDataBlock, _store_bits
+
+HEADER_SIZE = 32
+BIT_BYTES = MAX_BITS // 8
+REG_BYTES = MAX_REGS * 2
+UNIT_SIZE = 16 + BIT_BYTES * 3 + REG_BYTES * 3
+
+
+class _SharedTable:
+    """Generation-selected buffers shared by the datablocks below."""
+
+    def _attach(self, buffers, generation, lock):
+        self._buffers = buffers
+        self._generation = generation
+        self._lock = lock
+        # Master-written tables have one buffer and nothing to retry.
+        self._single = buffers[0] is buffers[1]
+        # Generation whose buffer `bits` / `regs` return in this process.
+        self._seen = int(generation[0])
+        # Elements where the back buffer lags the front (physics process).
+        self._stale = (0, 0)
+
+    def _front(self):
+        return self._buffers[self._seen & 1]
+
+    def _flip(self, store, lo, hi):
+        """Bring back up to date with front, apply store(back), which changes
+        elements [lo, hi), then make back the front."""
+        with self._lock:
+            generation = int(self._generation[0])
+            front = self._buffers[generation & 1]
+            back = self._buffers[(generation + 1) & 1]
+            stale_lo, stale_hi = self._stale
+            back[stale_lo:stale_hi] = front[stale_lo:stale_hi]
+            store(back)
+            self._generation[0] = generation + 1
+        self._seen = generation + 1
+        self._stale = (lo, hi)
+
+    def _read(self, read, address, count):
+        """Return read(address, count) taken from one published generation."""
+        if self._single:
+            return read(address, count)
+        while True:
+            with self._lock:
+                seen = self._seen = int(self._generation[0])
+            result = read(address, count)
+            with self._lock:
+                if int(self._generation[0]) - seen < 2:
+                    return result
+
+    def getValues(self, address, count=1):
+        return self._read(super().getValues, address, count)
+
+    def encode_read(self, address, count):
+        return self._read(super().encode_read, address, count)
+
+    def write(self, start, values):
+        with self._lock:
+            super().write(start, values)
+
+
+class SharedBitDataBlock(_SharedTable, PackedBitDataBlock):
+    """PackedBitDataBlock whose bits live in a SharedImage."""
+
+    def __init__(self, buffers, generation, lock):
+        self.address = 1
+        self.count = MAX_BITS
+        self.default_value = False
+        self._attach(buffers, generation, lock)
+
+    @property
+    def bits(self):
+        return self._front()
+
+    def publish(self, values, start=0):
+        values = np.asarray(values, dtype=bool)
+        self._flip(lambda back: _store_bits(back, start, values), start >> 3, (start + values.size + 7) >> 3)
+
+
+class SharedRegisterDataBlock(_SharedTable, RegisterDataBlock):
+    """RegisterDataBlock whose registers live in a SharedImage."""
+
+    def __init__(self, buffers, generation, lock):
+        self.address = 1
+        self.count = MAX_REGS
+        self.default_value = 0
+        self._attach(buffers, generation, lock)
+
+    @property
+    def regs(self):
+        return self._front()
+
+    def publish(self, values, start=0):
+        values = np.asarray(values, dtype=np.uint16)
+
+        def store(back):
+            back[start : start + values.size] = values
+
+        self._flip(store, start, start + values.size)
+
+
+class SharedImage:
+    """One shared-memory segment with the tables of `units` units.
+
+    Create it before forking the workers; the children inherit the mapping
+    and the lock.
+    """
+
+    def __init__(self, units):
+        self.units = units
+        self.lock = multiprocessing.Lock()
+        self.shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + units * UNIT_SIZE)
+        self._header = np.ndarray(4, dtype=np.uint64, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def tick_count(self):
+        """Ticks run by the physics process (read by the control window)."""
+        return int(self._header[0])
+
+    @tick_count.setter
+    def tick_count(self, value):
+        self._header[0] = value
+
+    @property
+    def overruns(self):
+        """Late ticks of the physics process."""
+        return int(self._header[1])
+
+    @overruns.setter
+    def overruns(self, value):
+        self._header[1] = value
+
+    @property
+    def violations(self):
+        """Safety rule violations seen by the physics process."""
+        return int(self._header[2])
+
+    @violations.setter
+    def violations(self, value):
+        self._header[2] = value
+
+    @property
+    def late_strokes(self):
+        """Strokes over their step timeout seen by the physics process."""
+        return int(self._header[3])
+
+    @late_strokes.setter
+    def late_strokes(self, value):
+        self._header[3] = value
+
+    def tables(self, unit):
+        """Return {"co", "di", "hr", "ir"} datablocks of unit index `unit`."""
+        offset = HEADER_SIZE + unit * UNIT_SIZE
+        generations = np.ndarray(2, dtype=np.uint64, buffer=self.shm.buf, offset=offset)
+        offset += 16
+
+        def array(dtype, count):
+            nonlocal offset
+            view = np.ndarray(count, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            offset += view.nbytes
+            return view
+
+        coils = array(np.uint8, BIT_BYTES)
+        di = (array(np.uint8, BIT_BYTES), array(np.uint8, BIT_BYTES))
+        hr = array(REG_DTYPE, MAX_REGS)
+        ir = (array(REG_DTYPE, MAX_REGS), array(REG_DTYPE, MAX_REGS))
+        # Master-written tables have a single buffer and a fixed generation.
+        fixed = np.zeros(1, dtype=np.uint64)
+        return {
+            "co": SharedBitDataBlock((coils, coils), fixed, self.lock),
+            "di": SharedBitDataBlock(di, generations[0:1], self.lock),
+            "hr": SharedRegisterDataBlock((hr, hr), fixed, self.lock),
+            "ir": SharedRegisterDataBlock(ir, generations[1:2], self.lock),
+        }
+
+    def unlink(self):
+        """Remove the segment; mappings stay valid until the processes exit."""
+        self.shm.unlink()
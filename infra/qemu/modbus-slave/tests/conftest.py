@@ -0,0 +1,6 @@
+"""The slave's modules are plain scripts side by side; import them directly."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,41 @@
+"""Analog channels of a many-unit simulation."""
+
+import time
+
+import numpy as np
+
+import modbus_slave as ms
+from analog import synthetic_analog
+
+CYCLE_MS = 10
+
+
+def build(units, channels):
+    plants = [ms.load_plant(None, None, 1) for _ in range(units)]
+    return ms.Simulation(
+        [ms.Unit(unit_id, hal, binding, analog=synthetic_analog(channels), motors=motors)
+         for unit_id, (hal, binding, motors, *_) in enumerate(plants, 1)],
+        CYCLE_MS,
+    )
+
+
+def test_inputs_follow_setpoints_on_every_unit():
+    sim = build(3, 4)
+    for unit in sim.units:
+        unit.control.setValues(1, [1000 * unit.unit_id] * 4)
+    sim.advance(1000)
+    for unit in sim.units:
+        np.testing.assert_allclose(unit.ir_block.read(0, 4), 1000 * unit.unit_id, atol=50)
+
+
+def test_many_analog_units_fit_the_cycle():
+    # Every unit ID, 8 channels each: the IR publishes must not copy whole
+    # tables, or the tick outgrows the 10 ms cycle of the HAL configs.
+    sim = build(247, 8)
+    sim.advance(10)
+    ticks = []
+    for _ in range(50):
+        start = time.perf_counter_ns()
+        sim.tick()
+        ticks.append(time.perf_counter_ns() - start)
+    assert np.median(ticks) < CYCLE_MS * 1_000_000
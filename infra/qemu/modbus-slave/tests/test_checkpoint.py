@@ -0,0 +1,109 @@
+"""Checkpoint and restore of the whole simulated plant."""
+
+import asyncio
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import modbus_slave as ms
+from analog import synthetic_analog
+from control import CHECKPOINT_SAVE, CONTROL_BASE, REG_CHECKPOINT
+
+PLC = os.path.join(os.path.dirname(__file__), "../../../../examples/industrial/conveyor_stamp.plc")
+HAL = """\
+[mapping.coils]
+conveyor_motor = 0
+stamp_valve = 1
+[mapping.discrete_inputs]
+sensor_in_position = 0
+sensor_stamp_down = 1
+sensor_stamp_up = 2
+start_button = 3
+"""
+
+
+def build(tmp_path, timing):
+    hal = tmp_path / "hal.toml"
+    hal.write_text(HAL)
+    plants = [ms.load_plant(str(hal), PLC, 1) for _ in range(2)]
+    units = [ms.Unit(unit_id, hal_map, binding, analog=synthetic_analog(4), motors=motors,
+                     safety=safety, timing=timing_binding)
+             for unit_id, (hal_map, binding, motors, safety, timing_binding) in enumerate(plants, 1)]
+    return ms.Simulation(units, 10, timing=timing)
+
+
+def state(sim):
+    """Copies of every state array and value the checkpoint covers."""
+    arrays = {name: getattr(sim, name).copy() for name in ("coil_image", "di_image", "hr_image", "ir_image")}
+    for model in (sim.bank, sim.motors, sim.analog, sim.safety, sim.timing):
+        for name in model.STATE_ARRAYS:
+            arrays[f"{type(model).__name__}.{name}"] = getattr(model, name).copy()
+    for unit in sim.units:
+        arrays[f"u{unit.unit_id}.di"] = unit.di_block.read(0, unit.map.di_span).copy()
+        arrays[f"u{unit.unit_id}.ir"] = unit.ir_block.read(0, 4).copy()
+    values = (sim.tick_count, sim.plant_ns, sim.safety.total, sim.timing.total)
+    return arrays, values
+
+
+def scenario(sim):
+    """A few stamping cycles with the conveyor on, then off."""
+    unit = sim.units[0]
+    unit.control.setValues(1, [100, 200, 300, 400])
+    for _ in range(3):
+        unit.coil_block.write(0, [True, True])
+        sim.advance(60)
+        unit.coil_block.write(0, [False, False])
+        sim.advance(40)
+    return state(sim)
+
+
+def assert_same(a, b):
+    arrays_a, values_a = a
+    arrays_b, values_b = b
+    assert arrays_a.keys() == arrays_b.keys()
+    for name in arrays_a:
+        np.testing.assert_array_equal(arrays_a[name], arrays_b[name], err_msg=name)
+    assert values_a == values_b
+
+
+@pytest.mark.parametrize("timing", [ms.TIMING_TICKS, ms.TIMING_EXACT])
+def test_restore_replays_bit_identically(tmp_path, timing):
+    sim = build(tmp_path, timing)
+    sim.advance(5)
+    sim.save_checkpoint()
+    saved = state(sim)
+    assert saved[1][:2] == (5, 5 * 10_000_000)
+    first = scenario(sim)
+    assert first[1] != saved[1]
+
+    sim.restore_checkpoint()
+    assert_same(state(sim), saved)
+    assert_same(scenario(sim), first)
+
+
+def test_checkpoint_write_does_not_block_the_server(tmp_path):
+    sim = build(tmp_path, ms.TIMING_TICKS)
+    device = sim.units[0].device
+    sim.units[0].control.attach(sim, lockstep=False)
+    sim.threaded = True
+    sim.advance(5)
+
+    async def serve():
+        write = asyncio.create_task(device.async_setValues(6, CONTROL_BASE + REG_CHECKPOINT, [CHECKPOINT_SAVE]))
+        await asyncio.sleep(0)
+        # Queued for the physics thread; other requests are still answered.
+        assert not write.done()
+        assert await device.async_getValues(3, CONTROL_BASE + REG_CHECKPOINT, 1) == [CHECKPOINT_SAVE]
+        sim.advance(3)
+        physics = threading.Thread(target=sim.run_commands)
+        physics.start()
+        physics.join()
+        assert await write is None
+
+    asyncio.run(serve())
+    sim.threaded = False
+    sim.advance(4)
+    sim.restore_checkpoint()
+    assert sim.tick_count == 8
@@ -0,0 +1,96 @@
+"""NumPy datablocks: packed storage and double-buffered publishing."""
+
+import numpy as np
+import pytest
+from pymodbus.constants import ExcCodes
+
+from datablock import MAX_BITS, MAX_REGS, PackedBitDataBlock, RegisterDataBlock
+from sharedimage import SharedImage
+
+
+@pytest.fixture
+def shared_image():
+    image = SharedImage(1)
+    yield image
+    image.shm.close()
+    image.unlink()
+
+
+@pytest.fixture
+def shared_tables(shared_image):
+    return shared_image.tables(0)
+
+
+def test_register_publish_matches_full_copy(shared_tables):
+    # Publishes only copy the span the back buffer lags by; the tables must
+    # still read as if every publish had copied the whole image.
+    rng = np.random.default_rng(1)
+    for block in (RegisterDataBlock(), shared_tables["ir"]):
+        reference = np.zeros(MAX_REGS, dtype=np.uint16)
+        for _ in range(500):
+            start = int(rng.integers(0, 256))
+            values = rng.integers(0, 1 << 16, int(rng.integers(0, 64)), dtype=np.uint16)
+            if rng.random() < 0.7:
+                block.publish(values, start)
+            else:
+                block.write(start, values)
+            reference[start : start + values.size] = values
+            np.testing.assert_array_equal(block.read(0, MAX_REGS), reference)
+
+
+def test_bit_publish_matches_full_copy(shared_tables):
+    rng = np.random.default_rng(2)
+    for block in (PackedBitDataBlock(), shared_tables["di"]):
+        reference = np.zeros(MAX_BITS, dtype=bool)
+        for _ in range(500):
+            # Unaligned starts and odd lengths: publishes share edge bytes.
+            start = int(rng.integers(0, 512))
+            values = rng.random(int(rng.integers(0, 40))) < 0.5
+            if rng.random() < 0.7:
+                block.publish(values, start)
+            else:
+                block.write(start, values)
+            reference[start : start + values.size] = values
+            np.testing.assert_array_equal(block.read(0, MAX_BITS), reference)
+
+
+def test_bits_round_trip_through_the_datablock_protocol():
+    # pymodbus addresses are shifted by one (see PackedBitDataBlock.address).
+    rng = np.random.default_rng(3)
+    block = PackedBitDataBlock()
+    reference = [False] * MAX_BITS
+    for _ in range(300):
+        count = int(rng.integers(1, 50))
+        start = int(rng.integers(0, 1024 - count))
+        values = (rng.random(count) < 0.5).tolist()
+        assert block.setValues(start + 1, values) is None
+        reference[start : start + count] = values
+        read = int(rng.integers(0, 1024 - 64))
+        assert block.getValues(read + 1, 64) == reference[read : read + 64]
+    assert block.getValues(MAX_BITS, 1) == reference[-1:]
+    assert block.getValues(MAX_BITS, 2) == ExcCodes.ILLEGAL_ADDRESS
+    assert block.getValues(0, 1) == ExcCodes.ILLEGAL_ADDRESS
+    assert block.setValues(MAX_BITS, [True, True]) == ExcCodes.ILLEGAL_ADDRESS
+
+
+@pytest.mark.parametrize("flips, attempts", [(0, 1), (1, 1), (2, 2), (3, 2)])
+def test_shared_reads_never_mix_two_ticks(shared_image, flips, attempts):
+    # A worker's view and the physics process' view of the same table.
+    writer = shared_image.tables(0)["ir"]
+    reader = shared_image.tables(0)["ir"]
+    writer.publish(np.full(4, 1))
+    calls = []
+
+    def read(address, count):
+        # Flip the table between reading the two halves, on the first try.
+        first = reader.regs[address : address + 2].tolist()
+        if not calls:
+            for value in range(2, 2 + flips):
+                writer.publish(np.full(4, value))
+        calls.append(None)
+        return first + reader.regs[address + 2 : address + count].tolist()
+
+    values = reader._read(read, 0, 4)
+    assert len(calls) == attempts
+    # One flip only fills the back buffer; a second reuses the one being read.
+    assert values == [1 if attempts == 1 else 1 + flips] * 4
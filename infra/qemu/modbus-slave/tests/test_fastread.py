@@ -0,0 +1,76 @@
+"""Pre-encoded range reads against pymodbus' generic encoding."""
+
+import asyncio
+
+import numpy as np
+import pytest
+from pymodbus.pdu.bit_message import ReadCoilsRequest, ReadDiscreteInputsRequest
+from pymodbus.pdu.register_message import ReadHoldingRegistersRequest, ReadInputRegistersRequest
+
+import modbus_slave as ms
+from control import CONTROL_BASE, CONTROL_SIZE
+from datablock import MAX_BITS, MAX_REGS
+from fastread import (
+    MAX_READ_BITS, MAX_READ_REGS, EncodedReadCoilsRequest, EncodedReadDiscreteInputsRequest,
+    EncodedReadHoldingRegistersRequest, EncodedReadInputRegistersRequest, EncodedReadResponse,
+)
+from sharedimage import SharedImage
+
+READS = [
+    (EncodedReadCoilsRequest, ReadCoilsRequest, MAX_BITS, MAX_READ_BITS),
+    (EncodedReadDiscreteInputsRequest, ReadDiscreteInputsRequest, MAX_BITS, MAX_READ_BITS),
+    (EncodedReadHoldingRegistersRequest, ReadHoldingRegistersRequest, MAX_REGS, MAX_READ_REGS),
+    (EncodedReadInputRegistersRequest, ReadInputRegistersRequest, MAX_REGS, MAX_READ_REGS),
+]
+
+
+@pytest.fixture(params=["private", "shared"])
+def device(request):
+    rng = np.random.default_rng(4)
+    image = None
+    if request.param == "shared":
+        image = SharedImage(1)
+        device = ms.build_device(tables=image.tables(0))
+    else:
+        device = ms.build_device()
+    store = device.store
+    store["c"].write(0, rng.random(MAX_BITS) < 0.5)
+    store["d"].publish(rng.random(MAX_BITS) < 0.5)
+    store["h"].inner.write(0, rng.integers(0, 1 << 16, MAX_REGS))
+    store["i"].publish(rng.integers(0, 1 << 16, MAX_REGS))
+    yield device
+    if image is not None:
+        image.shm.close()
+        image.unlink()
+
+
+def ranges(rng, size, max_count):
+    """(address, count) pairs: random, unaligned, and at the edges."""
+    yield from [
+        (0, 1), (0, max_count), (size - 1, 1), (size - max_count, max_count),
+        (size - 1, 2), (size, 1), (size - 3, max_count),
+        (0, 0), (0, max_count + 1), (CONTROL_BASE - 1, 2), (CONTROL_BASE, CONTROL_SIZE),
+    ]
+    for _ in range(300):
+        count = int(rng.integers(1, max_count + 1))
+        yield int(rng.integers(0, size - count + 1)), count
+
+
+def test_encoded_reads_match_generic_encoding(device):
+    rng = np.random.default_rng(5)
+
+    async def run():
+        for fast_class, generic_class, size, max_count in READS:
+            for address, count in ranges(rng, size, max_count):
+                fast = await fast_class(dev_id=1, address=address, count=count).update_datastore(device)
+                generic = await generic_class(dev_id=1, address=address, count=count).update_datastore(device)
+                where = f"{generic_class.__name__}({address}, {count})"
+                assert fast.function_code == generic.function_code, where
+                assert fast.encode() == generic.encode(), where
+                # Only in-range reads within the spec take the fast path.
+                served = 1 <= count <= max_count and address + count <= size
+                if fast_class is EncodedReadHoldingRegistersRequest:
+                    served = served and address + count <= CONTROL_BASE
+                assert isinstance(fast, EncodedReadResponse) == served, where
+
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+"""Request timing through the pymodbus trace hooks."""
+
+import asyncio
+
+from pymodbus.constants import ExcCodes
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.pdu.bit_message import ReadCoilsRequest
+from pymodbus.pdu.register_message import ReadHoldingRegistersRequest, ReadInputRegistersRequest
+
+import metrics
+import modbus_slave as ms
+
+
+def test_requests_are_timed_per_request(monkeypatch):
+    clock = [0]
+    monkeypatch.setattr(metrics.time, "perf_counter_ns", lambda: clock[0])
+    store = metrics.MetricsStore()
+    recorder = store.recorder()
+    device = ms.build_device()
+
+    def decode(pdu, at):
+        clock[0] = at
+        return recorder.trace_pdu(False, pdu)
+
+    def answer(pdu, at):
+        clock[0] = at
+        response = asyncio.run(pdu.update_datastore(device))
+        recorder.trace_pdu(True, response)
+
+    # Two connections reuse transaction id 1; a third request (an ignored
+    # unit ID) is decoded in between and never answered.
+    a = decode(ReadHoldingRegistersRequest(address=0, count=4, dev_id=1, transaction_id=1), 0)
+    b = decode(ReadInputRegistersRequest(address=0, count=4, dev_id=1, transaction_id=1), 1000)
+    decode(ReadCoilsRequest(address=0, count=8, dev_id=9, transaction_id=2), 2000)
+    answer(b, 5000)
+    answer(a, 9000)
+    recorder.trace_pdu(True, ExceptionResponse(3, ExcCodes.GATEWAY_NO_RESPONSE))
+
+    assert store.requests[0, [1, 3, 4]].tolist() == [0, 2, 1]
+    assert store.exceptions[0, [1, 3, 4]].tolist() == [0, 1, 0]
+    assert store.latency_sum_ns[0, [3, 4]].tolist() == [9000, 4000]
+    assert store.latency[0, 3, metrics.bucket(9)] == 1
+    assert store.latency[0, 4, metrics.bucket(4)] == 1
+    assert store.latency.sum() == 2
@@ -0,0 +1,28 @@
+"""BitSlicedCylinderBank against the reference CylinderBank."""
+
+import numpy as np
+import pytest
+
+from plant import BitSlicedCylinderBank, CylinderBank
+
+
+@pytest.mark.parametrize("count", [1, 63, 64, 130])
+def test_bit_sliced_bank_matches_cylinder_bank(count):
+    rng = np.random.default_rng(count)
+    extend_ticks = rng.integers(1, 20, count)
+    retract_ticks = rng.integers(1, 20, count)
+    reference = CylinderBank(count, extend_ticks, retract_ticks)
+    sliced = BitSlicedCylinderBank(count, extend_ticks, retract_ticks)
+    extend = np.zeros(count, dtype=bool)
+    retract = np.zeros(count, dtype=bool)
+    for _ in range(500):
+        # Valves hold for a while, so strokes both finish and get cut short.
+        change = rng.random(count) < 0.1
+        extend = np.where(change, rng.random(count) < 0.5, extend)
+        change = rng.random(count) < 0.1
+        retract = np.where(change, rng.random(count) < 0.5, retract)
+        np.testing.assert_array_equal(sliced.step(extend, retract), reference.step(extend, retract))
+        np.testing.assert_array_equal(sliced.sensor_home, reference.sensor_home)
+        np.testing.assert_array_equal(sliced.sensor_end, reference.sensor_end)
+        np.testing.assert_array_equal(sliced.extend_count, reference.extend_count)
+        np.testing.assert_array_equal(sliced.retract_count, reference.retract_count)
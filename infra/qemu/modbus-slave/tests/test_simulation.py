@@ -0,0 +1,41 @@
+"""Simulation of several units over joint images."""
+
+import numpy as np
+import pytest
+
+import modbus_slave as ms
+
+CYCLE_MS = 10
+
+
+def build(units, cylinders=2, **kwargs):
+    plants = [ms.load_plant(None, None, cylinders) for _ in range(units)]
+    return ms.Simulation(
+        [ms.Unit(unit_id, hal, binding, motors=motors)
+         for unit_id, (hal, binding, motors, *_) in enumerate(plants, 1)],
+        CYCLE_MS, **kwargs,
+    )
+
+
+def sensors(sim):
+    """(home, end) of every cylinder, as read back from each unit's DI table."""
+    out = []
+    for unit in sim.units:
+        binding = unit.binding
+        di = unit.di_block.read(0, unit.map.di_span)
+        out.append((di[binding.home_di] ^ binding.home_invert, di[binding.end_di] ^ binding.end_invert))
+    return [np.concatenate(column) for column in zip(*out)]
+
+
+@pytest.mark.parametrize("timing", [ms.TIMING_TICKS, ms.TIMING_EXACT])
+def test_di_tables_follow_the_bank_on_every_unit(timing):
+    sim = build(5, timing=timing)
+    rng = np.random.default_rng(3)
+    for _ in range(40):
+        for unit in sim.units:
+            if rng.random() < 0.3:
+                unit.coil_block.write(0, rng.random(unit.map.coil_span) < 0.5)
+        sim.advance(int(rng.integers(1, 30)))
+        home, end = sensors(sim)
+        np.testing.assert_array_equal(home, sim.bank.sensor_home)
+        np.testing.assert_array_equal(end, sim.bank.sensor_end)
@@ -0,0 +1,68 @@
+"""Tick accounting of the wall-clock simulation loop."""
+
+import threading
+
+import pytest
+
+import modbus_slave as ms
+from ticker import DeadlineTicker
+
+CYCLE_MS = 50
+TICKS = 20
+
+
+class FakeClock:
+    def __init__(self):
+        self.ns = 0
+
+    def __call__(self):
+        return self.ns
+
+    def sleep(self, seconds):
+        self.ns += int(seconds * 1e9)
+
+
+class Stop(Exception):
+    pass
+
+
+class BoundedTicker(DeadlineTicker):
+    """DeadlineTicker that ends simulation_loop after a fixed number of ticks."""
+
+    def wait(self, ready_ns=None):
+        if self.ticks == TICKS:
+            raise Stop
+        return super().wait(ready_ns)
+
+
+def test_wait_after_sleeping_to_the_deadline_is_not_late():
+    clock = FakeClock()
+    ticker = DeadlineTicker(10, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        ready = clock()
+        clock.ns = ticker.next_deadline_ns
+        assert ticker.wait(ready) == 0
+    assert ticker.overruns == 0
+
+
+def test_work_past_the_deadline_is_late():
+    clock = FakeClock()
+    ticker = DeadlineTicker(10, clock=clock, sleep=clock.sleep)
+    clock.ns = ready = ticker.next_deadline_ns + 2_000_000
+    assert ticker.wait(ready) == 2_000_000
+    assert ticker.overruns == 1
+
+
+@pytest.mark.parametrize("timing", [ms.TIMING_TICKS, ms.TIMING_EXACT])
+def test_idle_plant_has_no_overruns(timing):
+    hal, banks, motors, *_ = ms.load_plant(None, None, 1)
+    units = [ms.Unit(1, hal, banks, motors=motors)]
+    sim = ms.Simulation(units, CYCLE_MS, BoundedTicker(CYCLE_MS), timing=timing)
+    # One coil write halfway, so the run also covers a stroke.
+    writer = threading.Timer(TICKS / 2 * CYCLE_MS / 1e3, units[0].coil_block.write, (0, [True]))
+    writer.start()
+    with pytest.raises(Stop):
+        ms.simulation_loop(sim)
+    writer.join()
+    assert sim.tick_count == TICKS
+    assert sim.overruns == 0, sim.ticker.stats()
@@ -0,0 +1,41 @@
+"""Stroke timing monitor."""
+
+import numpy as np
+
+from checkpoint import Checkpoint
+from timing import STROKE_EXTEND, TimingBinding, TimingMonitor
+
+
+def monitor():
+    # Two cylinders, the first one's extend limited to 50 ms.
+    binding = TimingBinding([STROKE_EXTEND], [0], [50_000_000])
+    return TimingMonitor(binding, ["a.extend", "b.extend", "a.retract", "b.retract"], (2, 2, 0))
+
+
+NO_POSITIONS = np.zeros(0, dtype=bool)
+
+
+def check(timing, plant_ns, extend, end):
+    extend = np.array(extend)
+    end = np.array(end)
+    return timing.check(plant_ns, (extend, ~extend, NO_POSITIONS), (end, ~end, NO_POSITIONS))
+
+
+def test_state_arrays_exist_before_the_first_check():
+    timing = monitor()
+    for name in TimingMonitor.STATE_ARRAYS:
+        assert isinstance(getattr(timing, name), np.ndarray), name
+    Checkpoint([(timing, name) for name in TimingMonitor.STATE_ARRAYS]).save()
+
+
+def test_first_check_only_takes_the_baseline():
+    timing = monitor()
+    check(timing, 0, [True, False], [False, False])
+    over, _tight, _late = check(timing, 80_000_000, [True, False], [True, False])
+    assert over.tolist() == []
+    assert timing.samples.tolist() == [0, 0, 0, 0]
+    check(timing, 100_000_000, [False, False], [False, False])
+    check(timing, 110_000_000, [True, False], [False, False])
+    over, _tight, _late = check(timing, 180_000_000, [True, False], [True, False])
+    assert over.tolist() == [0]
+    assert timing.max_ns[0] == 70_000_000
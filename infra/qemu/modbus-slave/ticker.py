@@ -0,0 +1,179 @@
+"""Monotonic-deadline tick engine for the Modbus slave simulator.
+
+`time.sleep(cycle_s)` followed by the tick's work makes every cycle late
+by the work time plus scheduler jitter, and the error accumulates. The
+ticker below keeps an absolute deadline grid on `time.monotonic_ns` so
+the simulated plant advances at exactly `cycle_ms` on average, matching
+the RustPLC runtime's `cycle_time_ms`.
+
+Overrun policies (a tick whose deadline has already passed on entry):
+  - catch-up: run the missed ticks back to back until the grid is met
+              again; tick count always equals elapsed time / cycle.
+  - skip:     drop the missed deadlines and realign to the next future
+              deadline on the grid; physics time slips, never bursts.
+
+EventClock replaces the grid altogether for the event-driven engine:
+plant time is scaled monotonic time, and the engine blocks until either
+a coil write notifies it or the next scheduled sensor edge is due.
+"""
+
+import threading
+import time
+
+OVERRUN_CATCH_UP = "catch-up"
+OVERRUN_SKIP = "skip"
+OVERRUN_POLICIES = (OVERRUN_CATCH_UP, OVERRUN_SKIP)
+
+
+class DeadlineTicker:
+    """Periodic ticker on an absolute `time.monotonic_ns` deadline grid."""
+
+    def __init__(self, cycle_ms, policy=OVERRUN_SKIP, clock=time.monotonic_ns, sleep=time.sleep):
+        if policy not in OVERRUN_POLICIES:
+            raise ValueError(f"unknown overrun policy: {policy!r}")
+        self.period_ns = int(cycle_ms * 1_000_000)
+        if self.period_ns <= 0:
+            raise ValueError("cycle_ms must be positive")
+        self.policy = policy
+        self._clock = clock
+        self._sleep = sleep
+
+        self.ticks = 0           # ticks released so far
+        self.overruns = 0        # ticks that started after their deadline
+        self.skipped = 0         # deadlines dropped by the skip policy
+        self.max_late_ns = 0     # worst observed lateness
+        self.deadline_ns = 0     # deadline of the tick released last
+
+        self._next_ns = clock() + self.period_ns
+
+    def schedule(self, now):
+        """Release the pending tick at `now` (ns).
+
+        Counts an overrun and applies the overrun policy if the pending
+        deadline has already passed.
+
+        :returns: (absolute deadline in ns to run the tick at, lateness in ns);
+                  a negative lateness is the time left until the deadline
+        """
+        late = now - self._next_ns
+        if late >= 0:
+            self.overruns += 1
+            if late > self.max_late_ns:
+                self.max_late_ns = late
+            if self.policy == OVERRUN_SKIP and late >= self.period_ns:
+                missed = late // self.period_ns
+                self.skipped += missed
+                self._next_ns += missed * self.period_ns
+        deadline = self.deadline_ns = self._next_ns
+        self._next_ns += self.period_ns
+        self.ticks += 1
+        return deadline, late
+
+    @property
+    def next_deadline_ns(self):
+        """Deadline of the tick schedule() will release next."""
+        return self._next_ns
+
+    def wait(self, ready_ns=None):
+        """Block until the next deadline and return the tick's lateness in ns.
+
+        :param ready_ns: when the caller ran out of work, if it has already
+            slept towards the deadline itself; lateness is measured from
+            then rather than from now, so that sleep is not an overrun
+        """
+        now = self._clock()
+        deadline, late = self.schedule(now if ready_ns is None else min(ready_ns, now))
+        if late < 0:
+            remaining = deadline - self._clock()
+            if remaining > 0:
+                self._sleep(remaining / 1e9)
+            return 0
+        return late
+
+    def stats(self):
+        """Return a snapshot of the overrun counters."""
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "max_late_ms": self.max_late_ns / 1e6,
+        }
+
+
+class AsyncTickTask:
+    """Runs a tick callback on DeadlineTicker deadlines inside an asyncio loop.
+
+    Each tick is armed with `loop.call_at` on the absolute deadline, so the
+    physics shares the event loop with the Modbus server: a coil write that
+    the loop processed before a deadline is always seen by that tick.
+    The ticker must use `time.monotonic_ns`, the clock behind `loop.time()`.
+    """
+
+    def __init__(self, loop, ticker, callback):
+        self._loop = loop
+        self._ticker = ticker
+        self._callback = callback
+        self._handle = None
+
+    def start(self):
+        """Arm the first tick."""
+        self._arm()
+
+    def cancel(self):
+        """Stop ticking."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _arm(self):
+        deadline, _late = self._ticker.schedule(time.monotonic_ns())
+        self._handle = self._loop.call_at(deadline / 1e9, self._fire)
+
+    def _fire(self):
+        self._callback()
+        self._arm()
+
+
+class EventClock:
+    """Plant time without a tick grid, plus a wake-up flag.
+
+    now() is monotonic time since construction scaled by speed. wait()
+    blocks until notify() is called or a plant deadline is reached, so an
+    idle plant costs no CPU at all.
+    """
+
+    def __init__(self, speed=1.0, clock=time.monotonic_ns):
+        self.speed = speed
+        self._clock = clock
+        self._origin_ns = clock()
+        self._wake = threading.Event()
+
+    def now(self):
+        """Current plant time in ns."""
+        return self.plant_ns(self._clock())
+
+    def plant_ns(self, wall_ns):
+        """Plant time of a time.monotonic_ns() reading."""
+        return int((wall_ns - self._origin_ns) * self.speed)
+
+    def rewind(self, plant_ns):
+        """Make now() read plant_ns (the plant went back to a checkpoint)."""
+        self._origin_ns = self._clock() - int(plant_ns / self.speed)
+
+    def notify(self):
+        """Wake the engine (safe from any thread)."""
+        self._wake.set()
+
+    def wait(self, deadline_ns=None):
+        """Block until notify() or plant time deadline_ns; return plant time.
+
+        A notify() that arrives while the caller is busy is kept for the
+        next wait, so no coil write is ever missed.
+        """
+        if deadline_ns is not None:
+            timeout = (self._origin_ns + deadline_ns / self.speed - self._clock()) / 1e9
+            self._wake.wait(max(timeout, 0.0))
+        else:
+            self._wake.wait()
+        self._wake.clear()
+        return self.now()
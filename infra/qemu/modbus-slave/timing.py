@@ -0,0 +1,281 @@
+"""Measured stroke durations against the timing limits of a .plc file.
+
+The static timing verifier checks declared limits against declared device
+times; this module measures what the simulated plant actually does while
+Mode B runs, and flags limits the measurements come close to or break.
+
+A stroke is one command and the state it should bring about:
+  - extend / retract: the cylinder's valve command to its end / home
+    position being reached
+  - position:         a motor being switched on to its position sensor's
+    window being reached
+Strokes are laid end to end in STROKES order (every cylinder's extend,
+every cylinder's retract, every position sensor). Each check compares the
+commands with the previous ones: a rising command starts its stroke, a
+falling one abandons it, and the next rising edge of the target state ends
+it. Per stroke the count, sum, min, max and a log-linear histogram of the
+durations live in arrays allocated once, so percentiles are read from the
+histogram without keeping samples.
+
+Limits come from the [tasks] section:
+  - `timeout: 500ms` of a step limits every stroke its `wait: S == true`
+    statements wait for (S a sensor, or a device.state reference)
+  - `timing: task.T must_complete_within 3000ms` (or task.T.step) is
+    checked as a measured bound: the steps of the scope run one after the
+    other and each takes as long as the slowest stroke it waits for, so the
+    bound is the sum over its steps of their worst measured stroke
+`must_start_after` limits when a task starts, which the plant does not
+see; those rules are not monitored.
+
+A stroke is flagged when its worst duration leaves less than TIGHT_MARGIN
+of its limit, and each stroke over its limit is counted.
+"""
+
+import numpy as np
+
+from metrics import SUB_BUCKETS, bucket_upper_us
+
+STROKE_EXTEND = 0
+STROKE_RETRACT = 1
+STROKE_POSITION = 2
+STROKES = ("extend", "retract", "position")
+
+# Histogram resolution (ns) and size: log-linear like metrics.bucket, up
+# to about 26 s; longer strokes land in the last bucket.
+RESOLUTION_NS = 100_000
+NUM_BUCKETS = 128
+
+TIGHT_MARGIN = 0.2
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def buckets(units):
+    """metrics.bucket over an int64 array of RESOLUTION_NS units."""
+    units = np.maximum(units, 0)
+    shift = np.maximum(np.floor(np.log2(np.maximum(units, 1))).astype(np.int64) - 3, 0)
+    index = np.where(units < 2 * SUB_BUCKETS, units, shift * SUB_BUCKETS + (units >> shift))
+    return np.minimum(index, NUM_BUCKETS - 1)
+
+
+class TimingBinding:
+    """Timing limits of one or more stations.
+
+    Step timeouts as (source, index, limit_ns) triples, and the task scopes
+    as tables: task names and limits, the task of each step, and
+    (step, source, index) terms for the strokes each step waits for.
+    Indices are local to the source until concat moves them into joint
+    images.
+    """
+
+    def __init__(self, limit_source=(), limit_index=(), limit_ns=(), task_names=(),
+                 task_limit_ns=(), step_task=(), term_step=(), term_source=(), term_index=()):
+        self.limit_source = np.array(limit_source, dtype=np.intp)
+        self.limit_index = np.array(limit_index, dtype=np.intp)
+        self.limit_ns = np.array(limit_ns, dtype=np.int64)
+        self.task_names = list(task_names)
+        self.tasks = len(self.task_names)
+        self.task_limit_ns = np.array(task_limit_ns, dtype=np.int64)
+        self.step_task = np.array(step_task, dtype=np.intp)
+        self.term_step = np.array(term_step, dtype=np.intp)
+        self.term_source = np.array(term_source, dtype=np.intp)
+        self.term_index = np.array(term_index, dtype=np.intp)
+
+    @classmethod
+    def concat(cls, parts):
+        """Join per-unit bindings into one binding over the joint strokes.
+
+        :param parts: (binding, name_prefix, offsets) tuples; offsets gives
+            the unit's first index in each source, in STROKES order
+        """
+        bindings = [part[0] for part in parts]
+        limit_index, task_names, step_task, term_step, term_index = [], [], [], [], []
+        tasks = steps = 0
+        for binding, prefix, offsets in parts:
+            offsets = np.asarray(offsets, dtype=np.intp)
+            limit_index.append(binding.limit_index + offsets[binding.limit_source])
+            task_names += [prefix + name for name in binding.task_names]
+            step_task.append(binding.step_task + tasks)
+            term_step.append(binding.term_step + steps)
+            term_index.append(binding.term_index + offsets[binding.term_source])
+            tasks += binding.tasks
+            steps += binding.step_task.size
+        return cls(
+            np.concatenate([b.limit_source for b in bindings]),
+            np.concatenate(limit_index),
+            np.concatenate([b.limit_ns for b in bindings]),
+            task_names,
+            np.concatenate([b.task_limit_ns for b in bindings]),
+            np.concatenate(step_task),
+            np.concatenate(term_step),
+            np.concatenate([b.term_source for b in bindings]),
+            np.concatenate(term_index),
+        )
+
+
+class TimingMonitor:
+    """Measures every stroke of the plant and checks it against a
+    TimingBinding."""
+
+    # State saved by checkpoint.Checkpoint.
+    STATE_ARRAYS = (
+        "command", "reached", "start_ns", "armed", "samples", "sum_ns", "min_ns", "max_ns",
+        "exceeded", "histogram", "task_bound_ns", "task_late",
+    )
+    STATE_VALUES = ("total",)
+
+    def __init__(self, binding, names, sizes):
+        """:param names: stroke names, in STROKES order
+        :param sizes: number of strokes of each source, in STROKES order
+        """
+        self.binding = binding
+        self.names = names
+        self.count = len(names)
+        base = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+
+        # -1: no limit; the tightest timeout wins when several steps wait
+        # for the same stroke.
+        limit = np.full(self.count, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(limit, base[binding.limit_source] + binding.limit_index, binding.limit_ns)
+        self.limit_ns = np.where(limit == np.iinfo(np.int64).max, -1, limit)
+        self.step_task = binding.step_task
+        self.term_step = binding.term_step
+        self.term_stroke = base[binding.term_source] + binding.term_index
+        self.task_limit_ns = binding.task_limit_ns
+        self.task_bound_ns = np.zeros(binding.tasks, dtype=np.int64)
+        self.task_late = np.zeros(binding.tasks, dtype=bool)
+
+        # As if every stroke had been commanded and done: the first check
+        # only takes the baseline.
+        self.command = np.ones(self.count, dtype=bool)
+        self.reached = np.ones(self.count, dtype=bool)
+        self.start_ns = np.zeros(self.count, dtype=np.int64)
+        self.armed = np.zeros(self.count, dtype=bool)
+        self.samples = np.zeros(self.count, dtype=np.int64)
+        self.sum_ns = np.zeros(self.count, dtype=np.int64)
+        self.min_ns = np.full(self.count, -1, dtype=np.int64)
+        self.max_ns = np.full(self.count, -1, dtype=np.int64)
+        self.exceeded = np.zeros(self.count, dtype=np.int64)
+        self.histogram = np.zeros((self.count, NUM_BUCKETS), dtype=np.uint32)
+        self.total = 0
+
+    def check(self, plant_ns, commands, states):
+        """Time the strokes against the commands and states as of plant_ns.
+
+        :param commands: bool arrays of each source's command, in STROKES order
+        :param states: bool arrays of each source's target state, same order
+        :returns: (strokes with a new worst duration over their limit,
+                  strokes with a new worst duration leaving less than
+                  TIGHT_MARGIN of it, tasks whose measured bound now exceeds
+                  their limit), all usually empty
+        """
+        command = np.concatenate(commands)
+        reached = np.concatenate(states)
+        started = command & ~self.command
+        self.armed = (self.armed & command) | started
+        self.start_ns[started] = plant_ns
+        done = np.flatnonzero(self.armed & reached & ~self.reached)
+        self.command, self.reached = command, reached
+        if not done.size:
+            return _NONE, _NONE, _NONE
+
+        self.armed[done] = False
+        duration = plant_ns - self.start_ns[done]
+        self.samples[done] += 1
+        self.sum_ns[done] += duration
+        self.histogram[done, buckets(duration // RESOLUTION_NS)] += 1
+        first = self.min_ns[done] < 0
+        self.min_ns[done] = np.where(first | (duration < self.min_ns[done]), duration, self.min_ns[done])
+        limit = self.limit_ns[done]
+        over = (limit >= 0) & (duration > limit)
+        if over.any():
+            self.exceeded[done[over]] += 1
+            self.total += int(over.sum())
+
+        # Only a new worst case can change a flag or a task bound.
+        worse = duration > self.max_ns[done]
+        if not worse.any():
+            return _NONE, _NONE, _NONE
+        done, duration, limit, over = done[worse], duration[worse], limit[worse], over[worse]
+        self.max_ns[done] = duration
+        tight = (limit >= 0) & ~over & (limit - duration < limit * TIGHT_MARGIN)
+        return done[over], done[tight], self._check_tasks()
+
+    def _check_tasks(self):
+        """Recompute the task bounds; return the tasks newly over their limit."""
+        if not self.step_task.size:
+            return _NONE
+        step_worst = np.zeros(self.step_task.size, dtype=np.int64)
+        np.maximum.at(step_worst, self.term_step, np.maximum(self.max_ns[self.term_stroke], 0))
+        self.task_bound_ns = np.bincount(
+            self.step_task, step_worst, minlength=self.task_bound_ns.size
+        ).astype(np.int64)
+        late = self.task_bound_ns > self.task_limit_ns
+        onset = np.flatnonzero(late & ~self.task_late)
+        self.task_late = late
+        return onset
+
+    def percentiles(self, quantiles=QUANTILES):
+        """Upper bounds (ns) of the histogram buckets holding each quantile,
+        shape (strokes, quantiles); -1 where a stroke has no samples."""
+        cumulative = self.histogram.cumsum(axis=1, dtype=np.int64)
+        result = np.full((self.count, len(quantiles)), -1, dtype=np.int64)
+        measured = self.samples > 0
+        upper = np.array([bucket_upper_us(i) for i in range(NUM_BUCKETS)], dtype=np.int64) * RESOLUTION_NS
+        for q, quantile in enumerate(quantiles):
+            rank = np.ceil(self.samples * quantile).astype(np.int64)
+            index = (cumulative < rank[:, None]).sum(axis=1)
+            # The last bucket is open: report the measured max instead.
+            value = np.where(index >= NUM_BUCKETS - 1, self.max_ns, upper[np.minimum(index, NUM_BUCKETS - 1)])
+            result[measured, q] = np.minimum(value, self.max_ns)[measured]
+        return result
+
+    def render(self):
+        """Prometheus text lines for the metrics endpoint.
+
+        Only strokes that were measured or have a limit are listed.
+        """
+        shown = np.flatnonzero((self.samples > 0) | (self.limit_ns >= 0))
+        percentiles = self.percentiles()
+        lines = []
+        metric = "slave_stroke_duration_seconds"
+        lines += [f"# HELP {metric} Measured stroke duration, command to target state",
+                  f"# TYPE {metric} summary"]
+        for i in shown:
+            label = f'stroke="{self.names[i]}"'
+            for q, quantile in enumerate(QUANTILES):
+                value = percentiles[i, q]
+                if value >= 0:
+                    lines.append(f'{metric}{{{label},quantile="{quantile}"}} {value / 1e9:.9f}')
+            lines.append(f"{metric}_sum{{{label}}} {self.sum_ns[i] / 1e9:.9f}")
+            lines.append(f"{metric}_count{{{label}}} {self.samples[i]}")
+        for metric, kind, help_text, values in (
+            ("slave_stroke_duration_min_seconds", "gauge", "Shortest measured stroke (-1: none)",
+             self.min_ns),
+            ("slave_stroke_duration_max_seconds", "gauge", "Longest measured stroke (-1: none)",
+             self.max_ns),
+            ("slave_stroke_limit_seconds", "gauge", "Declared step timeout (-1: none)", self.limit_ns),
+            ("slave_stroke_limit_exceeded_total", "counter", "Strokes that took longer than the limit",
+             self.exceeded),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            scaled = kind == "gauge"
+            for i in shown:
+                value = values[i]
+                if scaled and value >= 0:
+                    value = f"{value / 1e9:.9f}"
+                lines.append(f'{metric}{{stroke="{self.names[i]}"}} {value}')
+        for metric, help_text, values in (
+            ("slave_task_bound_seconds", "Sum of the worst measured stroke of each step",
+             self.task_bound_ns),
+            ("slave_task_limit_seconds", "Declared must_complete_within", self.task_limit_ns),
+        ):
+            if not self.binding.tasks:
+                break
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            for name, value in zip(self.binding.task_names, values.tolist()):
+                lines.append(f'{metric}{{task="{name}"}} {value / 1e9:.9f}')
+        return lines
+
+
+_NONE = np.zeros(0, dtype=np.intp)